@@ -0,0 +1,77 @@
+from django.db import transaction
+
+from api.links import (
+    delete_links,
+    insert_links,
+    links_added,
+    links_removed,
+)
+from receipts.models import Receipt
+
+
+ADDED = "added"
+ALREADY_ADDED = "already_added"
+REMOVED = "removed"
+NOT_IN_LIST = "not_in_list"
+NOT_FOUND = "not_found"
+
+
+def get_links(model, user, recipe_ids):
+    """Существующие рецепты из recipe_ids и рецепты в списке.
+
+    Строки списка блокируются до конца транзакции, чтобы
+    параллельное удаление не изменило суммы корзины и счетчики
+    рецептов дважды.
+    """
+    found = set(
+        Receipt.objects.filter(pk__in=recipe_ids).values_list("pk", flat=True)
+    )
+    linked = set(
+        model.objects.select_for_update()
+        .filter(user=user, receipt_id__in=found)
+        .values_list("receipt_id", flat=True)
+    )
+    return found, linked
+
+
+def results(recipe_ids, statuses):
+    return [{"id": pk, "status": statuses[pk]} for pk in recipe_ids]
+
+
+@transaction.atomic
+def bulk_add(model, user, recipe_ids):
+    """Добавляет рецепты в избранное или корзину пользователя.
+
+    model - Favorite или ShoppingList. Рецепты проверяются одним
+    запросом, новые связи пишутся одним INSERT. Возвращает
+    результат для каждого id в порядке запроса.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    found, linked = get_links(model, user, recipe_ids)
+    statuses = {pk: NOT_FOUND for pk in recipe_ids}
+    new = [pk for pk in recipe_ids if pk in found and pk not in linked]
+    statuses.update({pk: ALREADY_ADDED for pk in (*linked, *new)})
+    # Строки, которые добавил параллельный запрос после чтения,
+    # не возвращаются, поэтому суммы и счетчики не меняются дважды.
+    added = insert_links(
+        model,
+        [{"user": user.pk, "receipt": pk} for pk in new],
+        returning="receipt",
+    )
+    statuses.update({pk: ADDED for pk in added})
+    links_added(model, user.pk, added)
+    return results(recipe_ids, statuses)
+
+
+@transaction.atomic
+def bulk_remove(model, user, recipe_ids):
+    """Убирает рецепты из избранного или корзины пользователя."""
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    found, linked = get_links(model, user, recipe_ids)
+    statuses = {pk: NOT_FOUND for pk in recipe_ids}
+    statuses.update({pk: NOT_IN_LIST for pk in found})
+    statuses.update({pk: REMOVED for pk in linked})
+    if linked:
+        links_removed(model, user.pk, linked)
+        delete_links(model, user_id=user.pk, receipt_id=linked)
+    return results(recipe_ids, statuses)
@@ -0,0 +1,133 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from receipts.models import (
+    CartIngredientTotal,
+    IngredientInRecipe,
+    ShoppingList,
+)
+
+
+def get_recipe_amounts(recipe_id):
+    """Количество каждого ингредиента в рецепте."""
+    return dict(
+        IngredientInRecipe.objects.filter(recipe_id=recipe_id).values_list(
+            "ingredient_id", "amount"
+        )
+    )
+
+
+def get_recipes_amounts(recipe_ids):
+    """Суммарное количество каждого ингредиента в нескольких рецептах."""
+    return dict(
+        IngredientInRecipe.objects.filter(recipe_id__in=recipe_ids)
+        .values("ingredient_id")
+        .annotate(total=Sum("amount"))
+        .order_by()
+        .values_list("ingredient_id", "total")
+    )
+
+
+def apply_deltas(users, deltas):
+    """Изменяет суммы ингредиентов в списках покупок пользователей.
+
+    users - список id пользователей или queryset из values_list
+    с flat=True, deltas - словарь {id ингредиента: изменение}.
+    Суммы меняются через F() одним UPDATE, строки с нулевой суммой
+    удаляются.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        added = [pk for pk, delta in deltas.items() if delta > 0]
+        if added:
+            CartIngredientTotal.objects.bulk_create(
+                (
+                    CartIngredientTotal(user_id=user_id, ingredient_id=pk)
+                    for user_id in users
+                    for pk in added
+                ),
+                ignore_conflicts=True,
+            )
+        totals = CartIngredientTotal.objects.filter(
+            user_id__in=users, ingredient_id__in=deltas
+        )
+        totals.update(
+            total=F("total")
+            + Case(
+                *(
+                    When(ingredient_id=pk, then=Value(delta))
+                    for pk, delta in deltas.items()
+                ),
+                output_field=IntegerField(),
+            )
+        )
+        totals.filter(total__lte=0).delete()
+
+
+def add_recipe_to_carts(users, recipe_id):
+    apply_deltas(users, get_recipe_amounts(recipe_id))
+
+
+def remove_recipe_from_carts(users, recipe_id):
+    apply_deltas(
+        users,
+        {pk: -amount for pk, amount in get_recipe_amounts(recipe_id).items()},
+    )
+
+
+def recipe_amounts_changed(recipe_id, old_amounts):
+    """Переносит изменение ингредиентов рецепта во все списки покупок,
+    в которых он есть."""
+    new_amounts = get_recipe_amounts(recipe_id)
+    deltas = {
+        pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+        for pk in new_amounts.keys() | old_amounts.keys()
+    }
+    apply_deltas(
+        ShoppingList.objects.filter(receipt_id=recipe_id).values_list(
+            "user_id", flat=True
+        ),
+        deltas,
+    )
+
+
+def calculate_totals(users=None):
+    """Суммы ингредиентов в списках покупок, посчитанные агрегацией.
+
+    Возвращает словарь {(id пользователя, id ингредиента): сумма}.
+    """
+    carts = ShoppingList.objects.all()
+    if users is not None:
+        carts = carts.filter(user_id__in=users)
+    rows = (
+        carts.values("user_id", "receipt__ingredientinrecipe__ingredient_id")
+        .annotate(total=Sum("receipt__ingredientinrecipe__amount"))
+        .filter(total__gt=0)
+        .order_by()
+        .values_list(
+            "user_id", "receipt__ingredientinrecipe__ingredient_id", "total"
+        )
+    )
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in rows.iterator()
+    }
+
+
+def rebuild_totals(batch_size=1000):
+    """Пересобирает таблицу сумм из списков покупок с нуля."""
+    with transaction.atomic():
+        CartIngredientTotal.objects.all().delete()
+        CartIngredientTotal.objects.bulk_create(
+            (
+                CartIngredientTotal(
+                    user_id=user_id, ingredient_id=ingredient_id, total=total
+                )
+                for (user_id, ingredient_id), total in (
+                    calculate_totals().items()
+                )
+            ),
+            batch_size=batch_size,
+        )
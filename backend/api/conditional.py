@@ -0,0 +1,98 @@
+import hashlib
+from functools import wraps
+
+from django.db.models import Exists, OuterRef
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition
+
+from api.querysets import get_recipes_queryset
+from api.snapshots import choose_encoding
+from api.versions import get_version
+from receipts.models import Follow
+
+
+def catalogue_condition(name):
+    """Условный GET для справочника по его версии.
+
+    Снимок справочника отдается в кодировке из Accept-Encoding,
+    поэтому кодировка входит в ETag, а ответы, в том числе 304,
+    варьируются по Accept-Encoding.
+    """
+
+    def etag(request, *args, **kwargs):
+        version, _ = get_version(name)
+        return f"{name}-{version}-{choose_encoding(request) or 'identity'}"
+
+    def last_modified(request, *args, **kwargs):
+        _, updated_at = get_version(name)
+        return updated_at
+
+    conditional = condition(etag_func=etag, last_modified_func=last_modified)
+
+    def decorator(view):
+        conditional_view = conditional(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_vary_headers(response, ("Accept-Encoding",))
+            return response
+
+        return wrapped
+
+    return decorator
+
+
+def get_recipe_state(request, pk):
+    """Возвращает время изменения рецепта и флаги пользователя.
+
+    Выполняет один легкий запрос без подгрузки связанных данных.
+    Результат запоминается на запросе, чтобы ETag и Last-Modified
+    не делали запрос дважды.
+    """
+    states = getattr(request, "_recipe_states", None)
+    if states is None:
+        states = request._recipe_states = {}
+    if pk not in states:
+        fields = ("updated_at",)
+        queryset = get_recipes_queryset(request.user).filter(pk=pk)
+        if request.user.is_authenticated:
+            fields += (
+                "is_favorited",
+                "is_in_shopping_cart",
+                "author_is_subscribed",
+            )
+            queryset = queryset.annotate(
+                author_is_subscribed=Exists(
+                    Follow.objects.filter(
+                        user=request.user, following=OuterRef("author")
+                    )
+                )
+            )
+        states[pk] = queryset.values_list(*fields).first()
+    return states[pk]
+
+
+def recipe_etag(request, pk, *args, **kwargs):
+    state = get_recipe_state(request, pk)
+    if state is None:
+        return None
+    raw = f"{pk}:{request.user.pk}:{state[0].isoformat()}:{state[1:]}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def recipe_last_modified(request, pk, *args, **kwargs):
+    """Время изменения рецепта для анонимного пользователя.
+
+    Флаги авторизованного пользователя меняются без изменения рецепта,
+    поэтому для него используется только ETag.
+    """
+    if request.user.is_authenticated:
+        return None
+    state = get_recipe_state(request, pk)
+    return state[0] if state else None
+
+
+recipe_condition = condition(
+    etag_func=recipe_etag, last_modified_func=recipe_last_modified
+)
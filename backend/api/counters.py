@@ -0,0 +1,62 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from receipts.models import Favorite, Receipt, ShoppingList
+
+
+# Счетчик рецепта для каждой модели связи пользователя с рецептом.
+COUNTER_FIELDS = {
+    Favorite: "favorites_count",
+    ShoppingList: "in_carts_count",
+}
+
+
+def change_counters(model, recipe_ids, delta):
+    """Изменяет счетчик рецептов на delta одним UPDATE через F().
+
+    Счетчик не опускается ниже нуля, даже если разошелся с таблицей
+    связей; расхождения исправляет reconcile_recipe_counters.
+    """
+    if not recipe_ids or not delta:
+        return
+    field = COUNTER_FIELDS[model]
+    value = F(field) + delta
+    if delta < 0:
+        value = Greatest(value, 0)
+    Receipt.objects.filter(pk__in=recipe_ids).update(**{field: value})
+
+
+def actual_counters():
+    """Выражения счетчиков, посчитанные по таблицам связей."""
+    counters = {}
+    for model, field in COUNTER_FIELDS.items():
+        counters[field] = Coalesce(
+            Subquery(
+                model.objects.filter(receipt=OuterRef("pk"))
+                .order_by()
+                .values("receipt")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+    return counters
+
+
+def get_drifted_recipes():
+    """Рецепты, счетчики которых расходятся с таблицами связей."""
+    counters = actual_counters()
+    return Receipt.objects.annotate(
+        **{f"actual_{field}": value for field, value in counters.items()}
+    ).exclude(**{field: F(f"actual_{field}") for field in counters})
+
+
+def reconcile_counters():
+    """Пересчитывает счетчики рецептов с расхождениями.
+
+    Возвращает число исправленных рецептов.
+    """
+    drifted = list(get_drifted_recipes().values_list("pk", flat=True))
+    if drifted:
+        Receipt.objects.filter(pk__in=drifted).update(**actual_counters())
+    return len(drifted)
@@ -0,0 +1,112 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+
+from api.shopping_list import (
+    CONTENT_TYPES,
+    DEFAULT_FORMAT,
+    get_cached_file,
+    get_summary_rows,
+)
+from receipts.models import ShoppingListExport
+
+
+def create_export(user):
+    """Ставит выгрузку списка покупок в очередь.
+
+    Если у пользователя уже есть задание в очереди, возвращается оно:
+    воркер выгрузит корзину в том виде, в каком она будет при запуске.
+    """
+    export = user.shopping_list_exports.filter(
+        status=ShoppingListExport.PENDING
+    ).first()
+    if export is None:
+        export = ShoppingListExport.objects.create(user=user)
+    return export
+
+
+def claim_export():
+    """Забирает из очереди самое старое задание.
+
+    Задание переводится в работу условным UPDATE, поэтому несколько
+    воркеров не получат одно задание.
+    """
+    pending = ShoppingListExport.objects.filter(
+        status=ShoppingListExport.PENDING
+    ).order_by("created_at")
+    for pk in pending.values_list("pk", flat=True)[:10]:
+        claimed = ShoppingListExport.objects.filter(
+            pk=pk, status=ShoppingListExport.PENDING
+        ).update(status=ShoppingListExport.RUNNING, started_at=timezone.now())
+        if claimed:
+            return ShoppingListExport.objects.select_related("user").get(
+                pk=pk
+            )
+    return None
+
+
+def process_export(export):
+    """Выгружает список покупок задания в файл."""
+    try:
+        content = get_cached_file(get_summary_rows(export.user))
+        export.file.save(
+            f"{export.pk}.{DEFAULT_FORMAT}", ContentFile(content), save=False
+        )
+        export.status = ShoppingListExport.DONE
+    except Exception as error:
+        export.status = ShoppingListExport.FAILED
+        export.error = str(error)
+    export.finished_at = timezone.now()
+    export.save(update_fields=("file", "status", "error", "finished_at"))
+    return export
+
+
+def requeue_stale_exports():
+    """Возвращает в очередь задания, воркер которых не завершил их."""
+    started_before = timezone.now() - timedelta(
+        seconds=settings.SHOPPING_LIST_EXPORT_TIMEOUT
+    )
+    return ShoppingListExport.objects.filter(
+        status=ShoppingListExport.RUNNING, started_at__lt=started_before
+    ).update(status=ShoppingListExport.PENDING, started_at=None)
+
+
+def delete_expired_exports():
+    """Удаляет завершенные задания старше срока хранения вместе с файлами."""
+    created_before = timezone.now() - timedelta(
+        seconds=settings.SHOPPING_LIST_EXPORT_TTL
+    )
+    expired = ShoppingListExport.objects.filter(
+        status__in=(ShoppingListExport.DONE, ShoppingListExport.FAILED),
+        created_at__lt=created_before,
+    )
+    for export in expired:
+        if export.file:
+            export.file.delete(save=False)
+        export.delete()
+
+
+def export_response(export):
+    """Ответ с готовым файлом выгрузки.
+
+    Если включен SHOPPING_LIST_EXPORT_X_ACCEL, файл отдает nginx
+    из тома с медиа по заголовку X-Accel-Redirect.
+    """
+    extension = export.file.name.rsplit(".", 1)[-1]
+    filename = f"shopping_list.{extension}"
+    if settings.SHOPPING_LIST_EXPORT_X_ACCEL:
+        response = HttpResponse(content_type=CONTENT_TYPES[extension])
+        response["X-Accel-Redirect"] = export.file.url
+        response["Content-Disposition"] = (
+            f'attachment; filename="{filename}"'
+        )
+        return response
+    return FileResponse(
+        export.file.open("rb"),
+        as_attachment=True,
+        filename=filename,
+        content_type=CONTENT_TYPES[extension],
+    )
@@ -0,0 +1,80 @@
+from operator import attrgetter
+
+
+AUTHOR_FIELDS = ("id", "username", "email", "first_name", "last_name")
+TAG_FIELDS = ("id", "name", "slug")
+INGREDIENT_FIELDS = ("id", "name", "measurement_unit")
+
+get_author_fields = attrgetter(*AUTHOR_FIELDS)
+get_tag_fields = attrgetter(*TAG_FIELDS)
+get_ingredient_fields = attrgetter(*INGREDIENT_FIELDS)
+
+
+def get_absolute_url(request, url):
+    """Повторяет построение ссылки на файл в serializers.ImageField."""
+    if url and request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def image_to_url(image, request=None):
+    """Ссылка на изображение в формате serializers.ImageField."""
+    if not image:
+        return None
+    try:
+        url = image.url
+    except AttributeError:
+        return None
+    return get_absolute_url(request, url)
+
+
+def author_to_dict(author):
+    """Автор рецепта без флага подписки и с относительной ссылкой
+    на аватар, как в AuthorCardSerializer."""
+    data = dict(zip(AUTHOR_FIELDS, get_author_fields(author)))
+    data["avatar"] = image_to_url(author.avatar)
+    return data
+
+
+def ingredient_to_dict(ingredient_in_recipe):
+    data = dict(
+        zip(
+            INGREDIENT_FIELDS,
+            get_ingredient_fields(ingredient_in_recipe.ingredient),
+        )
+    )
+    data["amount"] = ingredient_in_recipe.amount
+    return data
+
+
+def recipe_card_to_dict(recipe):
+    """Карточка рецепта в формате RecipeCardSerializer.
+
+    Ожидает подгруженные заранее тэги и ингредиенты рецепта.
+    """
+    return {
+        "id": recipe.pk,
+        "author": author_to_dict(recipe.author),
+        "tags": [
+            dict(zip(TAG_FIELDS, get_tag_fields(tag)))
+            for tag in recipe.tags.all()
+        ],
+        "ingredients": [
+            ingredient_to_dict(ingredient_in_recipe)
+            for ingredient_in_recipe in recipe.ingredientinrecipe.all()
+        ],
+        "name": str(recipe.name),
+        "image": image_to_url(recipe.image),
+        "text": str(recipe.text),
+        "cooking_time": int(recipe.cooking_time),
+    }
+
+
+def recipe_basic_to_dict(recipe, request=None):
+    """Краткий рецепт в формате RecipeSerializerGetRequestBasic."""
+    return {
+        "id": recipe.pk,
+        "name": str(recipe.name),
+        "image": image_to_url(recipe.image, request),
+        "cooking_time": int(recipe.cooking_time),
+    }
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from api.querysets import get_recipes_queryset
+from receipts.models import FeedEntry, Follow
+
+
+HEAVY_AUTHORS_KEY = "feed:heavy_authors"
+
+
+def get_heavy_author_ids():
+    """Авторы, рецепты которых не рассылаются по лентам при публикации."""
+    author_ids = cache.get(HEAVY_AUTHORS_KEY)
+    if author_ids is None:
+        author_ids = set(
+            Follow.objects.values("following")
+            .annotate(followers_count=Count("id"))
+            .filter(followers_count__gt=settings.FEED_FANOUT_LIMIT)
+            .values_list("following", flat=True)
+        )
+        cache.set(
+            HEAVY_AUTHORS_KEY,
+            author_ids,
+            timeout=settings.FEED_HEAVY_AUTHORS_CACHE_TIMEOUT,
+        )
+    return author_ids
+
+
+def publish_to_feeds(recipe):
+    """Добавляет рецепт в ленты подписчиков автора.
+
+    Если подписчиков больше FEED_FANOUT_LIMIT, рецепт в ленты
+    не пишется и подмешивается при чтении ленты.
+    """
+    follower_ids = list(
+        Follow.objects.filter(following=recipe.author_id).values_list(
+            "user_id", flat=True
+        )[: settings.FEED_FANOUT_LIMIT + 1]
+    )
+    if len(follower_ids) > settings.FEED_FANOUT_LIMIT:
+        cache.delete(HEAVY_AUTHORS_KEY)
+        return
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=follower_id,
+                receipt=recipe,
+                publish_time=recipe.publish_time,
+            )
+            for follower_id in follower_ids
+        ),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_feed(user_id, author_id):
+    """Добавляет в ленту последние рецепты автора после подписки."""
+    recipes = get_recipes_queryset().filter(author_id=author_id)[
+        : settings.FEED_BACKFILL_SIZE
+    ]
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                receipt=recipe,
+                publish_time=recipe.publish_time,
+            )
+            for recipe in recipes
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def remove_from_feed(user_id, author_id):
+    """Удаляет из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, receipt__author_id=author_id
+    ).delete()
+
+
+def get_feed_queryset(user):
+    """Возвращает рецепты ленты подписок пользователя.
+
+    Обычно лента читается одним проходом по индексу записей ленты
+    пользователя. Рецепты тяжелых авторов из подписок подмешиваются
+    по автору.
+    """
+    queryset = get_recipes_queryset(user)
+    heavy_author_ids = get_heavy_author_ids()
+    if heavy_author_ids:
+        followed_heavy_ids = list(
+            user.followers.filter(
+                following_id__in=heavy_author_ids
+            ).values_list("following_id", flat=True)
+        )
+        if followed_heavy_ids:
+            return queryset.filter(
+                Q(feed_entries__user=user)
+                | Q(author_id__in=followed_heavy_ids)
+            ).distinct()
+    return queryset.filter(feed_entries__user=user).order_by(
+        "-feed_entries__publish_time", "-feed_entries__receipt"
+    )
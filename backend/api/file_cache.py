@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+
+
+def content_key(*parts):
+    """Ключ кэша по содержимому: sha256 от частей в JSON."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class FileCache:
+    """Кэш файлов на диске с вытеснением давно не читанных (LRU).
+
+    Файлы общие для всех воркеров и хранятся в каталоге root_setting.
+    Время изменения файла обновляется при каждом чтении, при записи
+    самые старые файлы удаляются, пока общий размер больше
+    max_bytes_setting. Размер 0 отключает кэш.
+    """
+
+    def __init__(self, root_setting, max_bytes_setting):
+        self.root_setting = root_setting
+        self.max_bytes_setting = max_bytes_setting
+
+    @property
+    def root(self):
+        return Path(getattr(settings, self.root_setting))
+
+    @property
+    def max_bytes(self):
+        return getattr(settings, self.max_bytes_setting)
+
+    def get(self, key):
+        if not self.max_bytes:
+            return None
+        path = self.root / key
+        try:
+            content = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return content
+
+    def set(self, key, content):
+        if not self.max_bytes or len(content) > self.max_bytes:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / key
+        temporary = path.with_name(f".{key}.{os.getpid()}.tmp")
+        temporary.write_bytes(content)
+        os.replace(temporary, path)
+        self.evict()
+
+    def evict(self):
+        """Удаляет давно не читанные файлы сверх лимита размера."""
+        entries = []
+        total = 0
+        with os.scandir(self.root) as scan:
+            for entry in scan:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -1,6 +1,9 @@
 import django_filters
 from django.db.models import Q
+from rest_framework.filters import OrderingFilter
 
+from api.fuzzy_search import search_queryset
+from api.versions import INGREDIENTS, RECIPES
 from receipts.models import Ingredient, Receipt, Tag
 
 
@@ -10,10 +13,15 @@ class IngredientsFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(
         field_name="name", lookup_expr="istartswith"
     )
+    search = django_filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Ingredient
-        fields = ("name",)
+        fields = ("name", "search")
+
+    def filter_search(self, queryset, name, value):
+        """Нечеткий поиск по названию с сортировкой по сходству."""
+        return search_queryset(queryset, INGREDIENTS, value)
 
 
 class RecipesFilter(django_filters.FilterSet):
@@ -30,10 +38,17 @@ class RecipesFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.NumberFilter(
         method="filter_is_in_shopping_cart"
     )
+    search = django_filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Receipt
-        fields = ("author", "tags", "is_favorited", "is_in_shopping_cart")
+        fields = (
+            "author",
+            "tags",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "search",
+        )
 
     def filter_tags(self, queryset, name, value):
         """Фильтр для тэгов с использованием OR логики."""
@@ -61,3 +76,31 @@ class RecipesFilter(django_filters.FilterSet):
         elif user.is_authenticated and not value:
             return queryset.exclude(shopping_lists__user=user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Нечеткий поиск по названию с сортировкой по сходству."""
+        return search_queryset(queryset, RECIPES, value)
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """Сортировка рецептов по параметру ordering.
+
+    К полю добавляются время публикации и id в том же направлении,
+    что и у индексов рецептов, поэтому порядок однозначен, а
+    сортировка по счетчикам идет по индексу (в обе стороны).
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        prefix = "-" if ordering[0].startswith("-") else ""
+        fields = {field.lstrip("-") for field in ordering}
+        return (
+            *ordering,
+            *(
+                f"{prefix}{field}"
+                for field in ("publish_time", "id")
+                if field not in fields
+            ),
+        )
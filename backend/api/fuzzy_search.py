@@ -0,0 +1,194 @@
+import re
+from collections import defaultdict
+
+import numpy
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, IntegerField, Q
+from django.db.models.expressions import RawSQL
+
+from api.versions import INGREDIENTS, RECIPES, get_version
+from receipts.models import Ingredient, Receipt
+
+
+WORD_RE = re.compile(r"[^\W_]+")
+SOURCES = {
+    INGREDIENTS: Ingredient,
+    RECIPES: Receipt,
+}
+
+
+def uses_pg_trgm():
+    """Нечеткий поиск выполняется в базе, если это PostgreSQL."""
+    return connection.vendor == "postgresql"
+
+
+def trigrams(text):
+    """Множество триграмм строки по правилам pg_trgm.
+
+    Каждое слово приводится к нижнему регистру и дополняется двумя
+    пробелами в начале и одним в конце.
+    """
+    result = set()
+    for word in WORD_RE.findall(text.casefold()):
+        padded = f"  {word} "
+        result.update(
+            padded[position: position + 3]
+            for position in range(len(padded) - 2)
+        )
+    return result
+
+
+def expand_query(query):
+    """Возвращает запрос и его варианты с синонимами из SEARCH_SYNONYMS.
+
+    Синоним подставляется вместо слова, которое начинается
+    с ключа словаря: "помидорки" ищутся еще и как "томат".
+    """
+    words = WORD_RE.findall(query.casefold())
+    variants = [query]
+    for stem, synonym in settings.SEARCH_SYNONYMS.items():
+        replaced = [
+            synonym if word.startswith(stem) else word for word in words
+        ]
+        if replaced != words:
+            variants.append(" ".join(replaced))
+    return variants
+
+
+class TrigramIndex:
+    """Инвертированный индекс триграмм в памяти процесса.
+
+    Сходство считается как в pg_trgm: число общих триграмм,
+    деленное на размер объединения множеств триграмм. Списки
+    документов по триграммам хранятся массивами numpy, поэтому
+    общие триграммы всех документов считаются одним bincount.
+    """
+
+    def __init__(self, documents):
+        ids = []
+        sizes = []
+        postings = defaultdict(list)
+        for position, (pk, text) in enumerate(documents):
+            grams = trigrams(text)
+            ids.append(pk)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings[gram].append(position)
+        self.ids = numpy.array(ids, dtype=numpy.int64)
+        self.sizes = numpy.array(sizes, dtype=numpy.int32)
+        self.postings = {
+            gram: numpy.array(positions, dtype=numpy.int32)
+            for gram, positions in postings.items()
+        }
+
+    def search(self, query, threshold, limit=None):
+        """Возвращает пары (id, сходство) по убыванию сходства."""
+        grams = trigrams(query)
+        matched = [
+            self.postings[gram] for gram in grams if gram in self.postings
+        ]
+        if not matched:
+            return []
+        common = numpy.bincount(
+            numpy.concatenate(matched), minlength=len(self.ids)
+        )
+        size = len(grams)
+        # Объединение не меньше size, поэтому документы с числом общих
+        # триграмм меньше threshold * size отбрасываются без деления.
+        positions = numpy.flatnonzero(common >= threshold * size)
+        common = common[positions]
+        scores = common / (size + self.sizes[positions] - common)
+        passed = scores >= threshold
+        positions, scores = positions[passed], scores[passed]
+        if limit is not None and len(scores) > limit:
+            # Полностью сортируются только лучшие limit документов
+            # и документы с равным им сходством.
+            cutoff = numpy.partition(scores, len(scores) - limit)[
+                len(scores) - limit
+            ]
+            best = scores >= cutoff
+            positions, scores = positions[best], scores[best]
+        order = numpy.lexsort((self.ids[positions], -scores))[:limit]
+        return list(
+            zip(self.ids[positions[order]].tolist(), scores[order].tolist())
+        )
+
+
+_indexes = {}
+
+
+def get_trigram_index(name):
+    """Возвращает индекс справочника, перестраивая его при смене версии."""
+    version = get_version(name)
+    cached = _indexes.get(name)
+    if cached is None or cached[0] != version:
+        documents = SOURCES[name].objects.values_list("pk", "name")
+        cached = (version, TrigramIndex(documents.iterator()))
+        _indexes[name] = cached
+    return cached[1]
+
+
+def search_queryset(queryset, name, query):
+    """Оставляет в queryset записи, похожие на запрос по полю name,
+    и сортирует их по убыванию сходства.
+
+    В PostgreSQL используется оператор % из pg_trgm по GIN индексу,
+    в остальных базах - индекс триграмм в памяти, из которого берется
+    не больше FUZZY_SEARCH_LIMIT лучших записей.
+    """
+    threshold = settings.TRIGRAM_SIMILARITY_THRESHOLD
+    variants = expand_query(query)
+    if uses_pg_trgm():
+        from django.contrib.postgres.search import TrigramSimilarity
+        from django.db.models.functions import Cast, Greatest
+
+        condition = Q()
+        for variant in variants:
+            condition |= Q(name__trigram_similar=variant)
+        similarities = [
+            TrigramSimilarity("name", variant) for variant in variants
+        ]
+        similarity = (
+            Greatest(*similarities)
+            if len(similarities) > 1
+            else similarities[0]
+        )
+        # similarity() возвращает real; в double precision значение
+        # переживает курсор пагинации без потерь.
+        return (
+            queryset.filter(condition)
+            .annotate(search_similarity=Cast(similarity, FloatField()))
+            .filter(search_similarity__gte=threshold)
+            .order_by("-search_similarity", "pk")
+        )
+    index = get_trigram_index(name)
+    scores = {}
+    for variant in variants:
+        for pk, score in index.search(
+            variant, threshold, settings.FUZZY_SEARCH_LIMIT
+        ):
+            scores[pk] = max(score, scores.get(pk, 0))
+    ranked = sorted(scores, key=lambda pk: (-scores[pk], pk))
+    ranked = ranked[: settings.FUZZY_SEARCH_LIMIT]
+    if not ranked:
+        return queryset.none()
+    # Порядок задается одним выражением CASE: сборка такого же
+    # выражения из When занимает у ORM больше времени, чем сам поиск.
+    # Место аннотируется по имени, чтобы по нему мог искать курсор.
+    pk_column = "{}.{}".format(
+        connection.ops.quote_name(queryset.model._meta.db_table),
+        connection.ops.quote_name(queryset.model._meta.pk.column),
+    )
+    whens = " ".join(["WHEN %s THEN %s"] * len(ranked))
+    return (
+        queryset.filter(pk__in=ranked)
+        .annotate(
+            search_rank=RawSQL(
+                f"CASE {pk_column} {whens} END",
+                [value for item in enumerate(ranked) for value in item[::-1]],
+                output_field=IntegerField(),
+            )
+        )
+        .order_by("search_rank", "pk")
+    )
@@ -0,0 +1,124 @@
+import base64
+import binascii
+import re
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+
+
+DATA_URI_PATTERN = re.compile(r"data:image/[\w.+-]+;base64,")
+# Длина части строки base64 кратна 4, чтобы части декодировались
+# независимо друг от друга.
+CHUNK_SIZE = 64 * 1024
+# Сигнатуры поддерживаемых форматов: (смещение, байты, формат Pillow).
+SIGNATURES = (
+    (0, b"\xff\xd8\xff", "JPEG"),
+    (0, b"\x89PNG\r\n\x1a\n", "PNG"),
+    (0, b"GIF87a", "GIF"),
+    (0, b"GIF89a", "GIF"),
+    (8, b"WEBP", "WEBP"),
+)
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+SIGNATURE_LENGTH = 12
+
+
+def sniff_format(head):
+    """Формат изображения по первым байтам файла или None."""
+    for offset, signature, image_format in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if image_format == "WEBP" and not head.startswith(b"RIFF"):
+                continue
+            return image_format
+    return None
+
+
+def read_size(file, image_format):
+    """Размеры изображения из уже записанного начала файла.
+
+    Image.open читает только заголовок и не декодирует пиксели.
+    Если заголовок еще не записан целиком, возвращает None.
+    """
+    position = file.tell()
+    file.seek(0)
+    try:
+        with Image.open(file, formats=(image_format,)) as image:
+            return image.size
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        return None
+    except Image.DecompressionBombError:
+        raise ValidationError("Изображение слишком большое.")
+    finally:
+        file.seek(position)
+
+
+def check_pixels(size):
+    width, height = size
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise ValidationError(
+            "Разрешение изображения больше "
+            f"{settings.IMAGE_UPLOAD_MAX_PIXELS} пикселей."
+        )
+
+
+def decode_image(data):
+    """Декодирует изображение из data URI в base64 по частям.
+
+    Размер проверяется по длине строки до декодирования, формат -
+    по сигнатуре первой части, разрешение - по заголовку, как только
+    он декодирован. Части пишутся во временный файл, который уходит
+    на диск после FILE_UPLOAD_MAX_MEMORY_SIZE, поэтому в памяти
+    не бывает полной копии декодированного файла. Расширение файла
+    берется из формата, а не из заголовка data URI.
+    """
+    match = DATA_URI_PATTERN.match(data)
+    if match is None:
+        raise ValidationError("Ожидается изображение в формате data URI.")
+    start = match.end()
+    encoded_length = len(data) - start
+    if encoded_length // 4 * 3 > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise ValidationError(
+            "Размер изображения больше "
+            f"{settings.IMAGE_UPLOAD_MAX_BYTES} байт."
+        )
+    file = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    image_format = size = None
+    try:
+        for position in range(start, len(data), CHUNK_SIZE):
+            try:
+                chunk = base64.b64decode(
+                    data[position:position + CHUNK_SIZE], validate=True
+                )
+            except (binascii.Error, ValueError):
+                raise ValidationError("Некорректная строка base64.")
+            file.write(chunk)
+            if image_format is None:
+                image_format = sniff_format(chunk[:SIGNATURE_LENGTH])
+                if image_format is None:
+                    raise ValidationError(
+                        "Поддерживаются изображения "
+                        f"{', '.join(EXTENSIONS)}."
+                    )
+            if size is None:
+                size = read_size(file, image_format)
+                if size is not None:
+                    check_pixels(size)
+        if image_format is None:
+            raise ValidationError("Изображение пустое.")
+        if size is None:
+            raise ValidationError("Некорректное изображение.")
+    except ValidationError:
+        file.close()
+        raise
+    size_in_bytes = file.tell()
+    file.seek(0)
+    return UploadedFile(
+        file,
+        name=f"image.{EXTENSIONS[image_format]}",
+        content_type=f"image/{image_format.lower()}",
+        size=size_in_bytes,
+    )
@@ -0,0 +1,70 @@
+from bisect import bisect_left
+from itertools import islice
+
+from api.versions import INGREDIENTS, get_version
+from receipts.models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс ингредиентов по названию в памяти процесса.
+
+    Названия хранятся отсортированными в casefold, префикс ищется
+    бинарным поиском. Результаты ранжируются: точные совпадения,
+    совпадения по префиксу, затем вхождения подстроки.
+    """
+
+    def __init__(self, ingredients):
+        self.entries = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in ingredients
+        )
+        self.keys = [entry[0] for entry in self.entries]
+
+    def search(self, query, limit=None):
+        """Возвращает ингредиенты, подходящие под запрос.
+
+        Точные совпадения сортируются раньше остальных названий
+        с тем же префиксом, поэтому идут первыми.
+        """
+        query = query.strip().casefold()
+        limit = len(self.entries) if limit is None else limit
+        found = []
+        position = bisect_left(self.keys, query)
+        while (
+            len(found) < limit
+            and position < len(self.keys)
+            and self.keys[position].startswith(query)
+        ):
+            found.append(self.entries[position])
+            position += 1
+        if len(found) < limit:
+            contains = (
+                entry
+                for entry in self.entries
+                if query in entry[0] and not entry[0].startswith(query)
+            )
+            found.extend(islice(contains, limit - len(found)))
+        return [
+            {"id": pk, "name": name, "measurement_unit": measurement_unit}
+            for _, pk, name, measurement_unit in found
+        ]
+
+
+_index = None
+_index_version = None
+
+
+def get_ingredient_index():
+    """Возвращает индекс, перестраивая его при смене версии справочника.
+
+    Версия читается из кэша, поэтому база используется только
+    для перестроения индекса.
+    """
+    global _index, _index_version
+    version, _ = get_version(INGREDIENTS)
+    if _index is None or _index_version != version:
+        _index = IngredientIndex(
+            Ingredient.objects.values_list("pk", "name", "measurement_unit")
+        )
+        _index_version = version
+    return _index
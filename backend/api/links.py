@@ -0,0 +1,140 @@
+from django.db import connection
+
+from api.cart_totals import apply_deltas, get_recipes_amounts
+from api.counters import change_counters
+from receipts.models import ShoppingList
+
+
+def get_columns(model, values):
+    """Колонки таблицы модели и значения для полей из values."""
+    return [
+        (model._meta.get_field(name).column, value)
+        for name, value in values.items()
+    ]
+
+
+def can_return_rows():
+    """База возвращает вставленные строки через RETURNING.
+
+    Django 3.2 не использует RETURNING в SQLite, хотя SQLite
+    поддерживает его с версии 3.35.
+    """
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.features.can_return_columns_from_insert
+
+
+def insert_sql(model, columns, rows=1):
+    """INSERT ... ON CONFLICT DO NOTHING для rows строк колонок columns."""
+    quote_name = connection.ops.quote_name
+    placeholders = f"({', '.join(['%s'] * len(columns))})"
+    return (
+        f"INSERT INTO {quote_name(model._meta.db_table)} "
+        f"({', '.join(quote_name(column) for column in columns)}) "
+        f"VALUES {', '.join([placeholders] * rows)} "
+        "ON CONFLICT DO NOTHING"
+    )
+
+
+def insert_link(model, **values):
+    """Создает строку одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Конфликт с уникальным ограничением модели не считается ошибкой:
+    возвращает True, если строка добавлена, и False, если она уже
+    была. Сигналы не отправляются, связанные данные обновляет
+    вызывающий. Где база поддерживает RETURNING, результат читается
+    из него, иначе из числа вставленных строк.
+    """
+    columns = get_columns(model, values)
+    sql = insert_sql(model, [column for column, _ in columns])
+    params = [value for _, value in columns]
+    with connection.cursor() as cursor:
+        if can_return_rows():
+            cursor.execute(
+                f"{sql} RETURNING "
+                f"{connection.ops.quote_name(model._meta.pk.column)}",
+                params,
+            )
+            return cursor.fetchone() is not None
+        cursor.execute(sql, params)
+        return cursor.rowcount > 0
+
+
+def insert_links(model, rows, returning):
+    """Создает строки одним INSERT ... ON CONFLICT DO NOTHING.
+
+    rows - словари значений полей с одинаковыми ключами. Возвращает
+    значения поля returning только у строк, добавленных этим
+    запросом: строки, которые уже были или которые параллельно
+    добавил другой запрос, в результат не попадают. Без RETURNING
+    строки вставляются по одной через insert_link.
+    """
+    if not rows:
+        return []
+    if not can_return_rows():
+        return [row[returning] for row in rows if insert_link(model, **row)]
+    columns = [column for column, _ in get_columns(model, rows[0])]
+    params = [
+        value for row in rows for _, value in get_columns(model, row)
+    ]
+    returning_column = connection.ops.quote_name(
+        model._meta.get_field(returning).column
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"{insert_sql(model, columns, len(rows))} "
+            f"RETURNING {returning_column}",
+            params,
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def delete_links(model, **filters):
+    """Удаляет строки одним DELETE и возвращает их число.
+
+    Значение-список сравнивается через IN. Сигналы не отправляются.
+    """
+    quote_name = connection.ops.quote_name
+    conditions = []
+    params = []
+    for column, value in get_columns(model, filters):
+        if isinstance(value, (list, tuple, set, frozenset)):
+            value = list(value)
+            conditions.append(
+                f"{quote_name(column)} IN ({', '.join(['%s'] * len(value))})"
+            )
+            params.extend(value)
+        else:
+            conditions.append(f"{quote_name(column)} = %s")
+            params.append(value)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote_name(model._meta.db_table)} "
+            f"WHERE {' AND '.join(conditions)}",
+            params,
+        )
+        return cursor.rowcount
+
+
+def cart_deltas(model, recipe_ids, sign=1):
+    """Изменения сумм ингредиентов корзины; для избранного их нет."""
+    if model is not ShoppingList or not recipe_ids:
+        return {}
+    return {
+        pk: sign * amount
+        for pk, amount in get_recipes_amounts(recipe_ids).items()
+    }
+
+
+def links_added(model, user_id, recipe_ids):
+    """Обновляет данные, зависящие от избранного или корзины, после
+    добавления рецептов запросом без сигналов: суммы ингредиентов
+    корзины и счетчики рецептов."""
+    apply_deltas((user_id,), cart_deltas(model, recipe_ids))
+    change_counters(model, recipe_ids, 1)
+
+
+def links_removed(model, user_id, recipe_ids):
+    """То же, что links_added, после удаления рецептов."""
+    apply_deltas((user_id,), cart_deltas(model, recipe_ids, sign=-1))
+    change_counters(model, recipe_ids, -1)
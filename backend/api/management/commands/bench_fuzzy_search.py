@@ -0,0 +1,158 @@
+import random
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+import pandas
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.fuzzy_search import TrigramIndex, search_queryset, uses_pg_trgm
+from api.versions import RECIPES
+from receipts.models import Receipt
+
+
+User = get_user_model()
+DISHES = (
+    "Салат",
+    "Суп",
+    "Пирог",
+    "Рагу",
+    "Запеканка",
+    "Омлет",
+    "Паста",
+    "Плов",
+    "Котлеты",
+    "Соус",
+)
+TEMPLATES = (
+    "{dish} с {first}",
+    "{dish} из {first} и {second}",
+    "Домашний {dish} c {first}",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет время нечеткого поиска по названиям на синтетическом "
+        "каталоге рецептов. Названия строятся из справочника ингредиентов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=100000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--path",
+            type=str,
+            default="data",
+            help="путь к директории где расположен ingredients.csv",
+        )
+        parser.add_argument(
+            "--database",
+            action="store_true",
+            help="дополнительно искать в базе, записи откатываются",
+        )
+
+    def handle(self, *args, **options):
+        generator = random.Random(options["seed"])
+        root_path = Path(__file__).resolve().parents[4]
+        ingredients = list(
+            pandas.read_csv(
+                root_path.joinpath(options["path"], "ingredients.csv"),
+                header=None,
+            )[0]
+        )
+        names = [
+            self.make_name(generator, ingredients)
+            for _ in range(options["recipes"])
+        ]
+        queries = [
+            self.make_typo(generator, generator.choice(names))
+            for _ in range(options["queries"])
+        ]
+
+        started = perf_counter()
+        index = TrigramIndex(enumerate(names))
+        print(
+            f"Индекс на {len(names)} названий построен "
+            f"за {perf_counter() - started:.1f} с"
+        )
+        threshold = settings.TRIGRAM_SIMILARITY_THRESHOLD
+        self.report(
+            "Индекс в памяти",
+            lambda query: index.search(
+                query, threshold, settings.FUZZY_SEARCH_LIMIT
+            ),
+            queries,
+        )
+        if options["database"]:
+            with transaction.atomic():
+                self.create_recipes(names)
+                self.report(
+                    "PostgreSQL pg_trgm"
+                    if uses_pg_trgm()
+                    else "База и индекс в памяти",
+                    lambda query: list(
+                        search_queryset(
+                            Receipt.objects.all(), RECIPES, query
+                        ).values_list("pk", flat=True)[
+                            : settings.FUZZY_SEARCH_LIMIT
+                        ]
+                    ),
+                    queries,
+                )
+                transaction.set_rollback(True)
+
+    def make_name(self, generator, ingredients):
+        first, second = generator.sample(ingredients, 2)
+        return generator.choice(TEMPLATES).format(
+            dish=generator.choice(DISHES), first=first, second=second
+        )
+
+    def make_typo(self, generator, name):
+        """Запрос из части названия с одной опечаткой."""
+        words = name.split()
+        query = list(" ".join(words[: generator.randint(1, len(words))]))
+        position = generator.randrange(len(query))
+        if generator.random() < 0.5:
+            del query[position]
+        else:
+            query[position] = generator.choice("абвгдеклмнопрст")
+        return "".join(query)
+
+    def create_recipes(self, names):
+        author = User.objects.create_user(
+            username="bench_author", email="bench_author@example.com"
+        )
+        Receipt.objects.bulk_create(
+            (
+                Receipt(
+                    author=author,
+                    name=name,
+                    text="Описание рецепта",
+                    cooking_time=1,
+                    image="recipes/images/bench.png",
+                )
+                for name in names
+            ),
+            batch_size=1000,
+        )
+
+    def report(self, title, search, queries):
+        search(queries[0])
+        timings = []
+        found = 0
+        for query in queries:
+            started = perf_counter()
+            found += len(search(query))
+            timings.append((perf_counter() - started) * 1000)
+        timings.sort()
+        print(
+            f"{title}: медиана {median(timings):.2f} мс, "
+            f"p95 {timings[int(len(timings) * 0.95)]:.2f} мс, "
+            f"максимум {timings[-1]:.2f} мс, "
+            f"в среднем найдено {found / len(queries):.0f}"
+        )
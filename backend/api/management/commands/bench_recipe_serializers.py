@@ -0,0 +1,104 @@
+from timeit import repeat
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ModelSerializer
+
+from api.fast_serializers import recipe_basic_to_dict, recipe_card_to_dict
+from api.querysets import get_recipes_queryset, prefetch_recipe_cards
+from api.serializers import RecipeCardSerializer
+from api.serializers import RecipeSerializerGetRequestBasic
+from receipts.models import Ingredient, IngredientInRecipe, Receipt, Tag
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает сериализацию рецептов через DRF и быстрый путь. "
+        "Тестовые данные создаются в транзакции и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=1000)
+        parser.add_argument("--ingredients", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        basic_serializer = RecipeSerializerGetRequestBasic()
+        with transaction.atomic():
+            recipes = self.create_recipes(
+                options["recipes"], options["ingredients"]
+            )
+            self.compare(
+                "Карточка рецепта",
+                lambda: RecipeCardSerializer(recipes, many=True).data,
+                lambda: [recipe_card_to_dict(recipe) for recipe in recipes],
+                options["repeat"],
+            )
+            self.compare(
+                "Краткий рецепт",
+                lambda: [
+                    ModelSerializer.to_representation(basic_serializer, recipe)
+                    for recipe in recipes
+                ],
+                lambda: [recipe_basic_to_dict(recipe) for recipe in recipes],
+                options["repeat"],
+            )
+            transaction.set_rollback(True)
+
+    def create_recipes(self, recipes_count, ingredients_count):
+        author = User.objects.create_user(
+            username="bench_author", email="bench_author@example.com"
+        )
+        tag = Tag.objects.create(name="бенчмарк", slug="bench")
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"бенчмарк {number}", measurement_unit="г")
+            for number in range(ingredients_count)
+        )
+        ingredient_ids = Ingredient.objects.filter(
+            name__startswith="бенчмарк "
+        ).values_list("pk", flat=True)
+        Receipt.objects.bulk_create(
+            Receipt(
+                author=author,
+                name=f"Рецепт {number}",
+                text="Описание рецепта",
+                cooking_time=number % 120 + 1,
+                image="recipes/images/bench.png",
+            )
+            for number in range(recipes_count)
+        )
+        recipe_ids = Receipt.objects.filter(author=author).values_list(
+            "pk", flat=True
+        )
+        Receipt.tags.through.objects.bulk_create(
+            Receipt.tags.through(receipt_id=recipe_id, tag=tag)
+            for recipe_id in recipe_ids
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe_id=recipe_id, ingredient_id=ingredient_id, amount=10
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in ingredient_ids
+        )
+        recipes = list(get_recipes_queryset().filter(author=author))
+        prefetch_recipe_cards(recipes)
+        return recipes
+
+    def compare(self, title, drf_path, fast_path, repeat_count):
+        renderer = JSONRenderer()
+        if renderer.render(drf_path()) != renderer.render(fast_path()):
+            print(f"{title}: результаты сериализации отличаются!")
+            return
+        drf_time = min(repeat(drf_path, number=1, repeat=repeat_count))
+        fast_time = min(repeat(fast_path, number=1, repeat=repeat_count))
+        print(
+            f"{title}: DRF {drf_time * 1000:.1f} мс, "
+            f"быстрый путь {fast_time * 1000:.1f} мс, "
+            f"ускорение x{drf_time / fast_time:.1f}"
+        )
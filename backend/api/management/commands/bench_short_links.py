@@ -0,0 +1,93 @@
+import random
+from statistics import median
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from shortlink import short_link
+from shortlink.models import ShortLink
+from shortlink.views import reverse_short
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет время ответа на переход по короткой ссылке: коды "
+        "рецептов, сохраненные ссылки без кэша и из кэшей, неизвестные "
+        "коды. Созданные ссылки откатываются, из общего кэша удаляются "
+        "только ключи замера, переходы не учитываются. Локальный кэш "
+        "хранит не больше 300 ключей, поэтому --links больше 200 "
+        "имеет смысл только с Redis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--links",
+            type=int,
+            default=200,
+            help="сохраненных ссылок (и еще четверть неизвестных кодов)",
+        )
+        parser.add_argument("--hits", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        generator = random.Random(options["seed"])
+        factory = RequestFactory()
+        hits = options["hits"]
+        links = options["links"]
+        recipe_codes = [
+            short_link.encode_recipe_id(generator.randint(1, 10**6))
+            for _ in range(hits)
+        ]
+        stored_codes = [f"bench{number:08d}" for number in range(links)]
+        unknown = [f"unknown{number}" for number in range(links // 4)]
+        self.codes = stored_codes + unknown
+        # Переходы не учитываются: фоновая запись буфера прошла бы
+        # мимо откатываемой транзакции.
+        no_hits = override_settings(SHORT_LINK_HITS_FLUSH_SIZE=0)
+        with no_hits, transaction.atomic():
+            self.create_links(stored_codes)
+            self.clear_caches()
+            warmed = stored_codes[:hits]
+            sample = [generator.choice(warmed) for _ in range(hits)]
+            self.report("Коды рецептов", factory, recipe_codes)
+            self.report("Сохраненные, промах", factory, warmed)
+            self.report("Сохраненные, LRU", factory, sample)
+            short_link.clear_resolved()
+            self.report("Сохраненные, общий кэш", factory, sample)
+            self.report("Неизвестные, промах", factory, unknown)
+            self.report("Неизвестные, кэш", factory, unknown)
+            self.clear_caches()
+            transaction.set_rollback(True)
+
+    def create_links(self, codes):
+        ShortLink.objects.bulk_create(
+            (
+                ShortLink(full_url=f"/bench/{code}", short_link=code)
+                for code in codes
+            ),
+            batch_size=1000,
+        )
+
+    def clear_caches(self):
+        """Сбрасывает LRU процесса и ключи замера в общем кэше."""
+        short_link.clear_resolved()
+        cache.delete_many(
+            [short_link.link_cache_key(code) for code in self.codes]
+        )
+
+    def report(self, title, factory, codes):
+        timings = []
+        for code in codes:
+            request = factory.get(f"/s/{code}/")
+            started = perf_counter()
+            reverse_short(request, code)
+            timings.append((perf_counter() - started) * 1_000_000)
+        timings.sort()
+        print(
+            f"{title}: медиана {median(timings):.0f} мкс, "
+            f"p95 {timings[int(len(timings) * 0.95)]:.0f} мкс, "
+            f"максимум {timings[-1]:.0f} мкс"
+        )
@@ -0,0 +1,27 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.snapshots import CATALOGUES, write_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Записывает снимки справочников тэгов и ингредиентов "
+        "в CATALOGUE_SNAPSHOT_ROOT в JSON, gzip и brotli."
+    )
+
+    def handle(self, *args, **options):
+        print(f"Snapshots directory: {settings.CATALOGUE_SNAPSHOT_ROOT}")
+        for name in CATALOGUES:
+            started = perf_counter()
+            variants = write_snapshot(name)
+            sizes = ", ".join(
+                f"{encoding or 'json'} {len(content)} б"
+                for encoding, content in variants.items()
+            )
+            print(
+                f"{name}: {sizes}, "
+                f"{(perf_counter() - started) * 1000:.0f} мс"
+            )
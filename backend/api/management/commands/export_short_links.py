@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.short_link_map import write_short_link_map
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает короткие ссылки рецептов, добавленных с прошлого запуска, "
+        "и дописывает их в карту nginx SHORT_LINK_MAP_PATH. "
+        "После выгрузки nginx нужно перечитать конфигурацию "
+        "(nginx -s reload)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="собрать карту заново для всех рецептов",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        added, skipped = write_short_link_map(
+            full=options["full"], batch_size=options["batch_size"]
+        )
+        print(
+            f"{settings.SHORT_LINK_MAP_PATH}: {added} added, "
+            f"{skipped} skipped"
+        )
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.exports import (
+    claim_export,
+    delete_expired_exports,
+    process_export,
+    requeue_stale_exports,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Воркер выгрузки списков покупок: забирает задания из базы "
+        "и сохраняет готовые файлы в MEDIA_ROOT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="выполнить задания в очереди и завершиться",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            requeue_stale_exports()
+            delete_expired_exports()
+            export = claim_export()
+            while export is not None:
+                process_export(export)
+                print(f"Export {export.pk}: {export.status}")
+                export = claim_export()
+            if options["once"]:
+                return
+            time.sleep(settings.SHOPPING_LIST_EXPORT_POLL_INTERVAL)
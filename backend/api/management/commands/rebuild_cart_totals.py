@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from api.cart_totals import calculate_totals, rebuild_totals
+from receipts.models import CartIngredientTotal
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет суммы ингредиентов в списках покупок с агрегацией "
+        "по рецептам и пересобирает таблицу с нуля."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="только сверить, не пересобирая таблицу",
+        )
+
+    def handle(self, *args, **options):
+        expected = calculate_totals()
+        stored = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in (
+                CartIngredientTotal.objects.values_list(
+                    "user_id", "ingredient_id", "total"
+                ).iterator()
+            )
+        }
+        mismatched = {
+            key
+            for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        }
+        print(
+            f"Cart totals: {len(stored)} stored, {len(expected)} expected, "
+            f"{len(mismatched)} mismatched"
+        )
+        if options["check"]:
+            return
+        rebuild_totals()
+        print("Cart totals rebuilt")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from api.counters import get_drifted_recipes, reconcile_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет счетчики избранного и списков покупок рецептов "
+        "с таблицами связей и исправляет расхождения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="только сверить, не исправляя счетчики",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            print(f"Recipe counters: {get_drifted_recipes().count()} drifted")
+            return
+        print(f"Recipe counters: {reconcile_counters()} fixed")
@@ -1,6 +1,146 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class LimitPagination(PageNumberPagination):
     page_size_query_param = "limit"
     page_size = 6
+
+
+class RecipePagination(LimitPagination):
+    """Пагинация рецептов по номеру страницы или по курсору.
+
+    Режим курсора включается параметром ?cursor= (пустым для первой
+    страницы) и ищет следующую страницу по ключам сортировки
+    запроса (по умолчанию (publish_time, id)) без COUNT(*) и OFFSET.
+    Сортировка ?ordering= и порядок ленты сохраняются, курсор
+    помнит сортировку, для которой выдан.
+    """
+
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Неверный курсор."
+    cursor_alias = "cursor_key_{}"
+
+    def get_cursor_ordering(self, queryset):
+        """Ключи сортировки запроса, последний из них - id рецепта."""
+        ordering = tuple(
+            queryset.query.order_by or queryset.model._meta.ordering
+        )
+        if not all(isinstance(field, str) for field in ordering):
+            raise ValidationError(
+                {self.cursor_query_param: "Сортировка не поддерживается."}
+            )
+        if not {"id", "pk"} & {field.lstrip("-") for field in ordering}:
+            prefix = "-" if ordering and ordering[-1].startswith("-") else ""
+            ordering += (f"{prefix}id",)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        limit = self.get_page_size(request)
+        self.ordering = self.get_cursor_ordering(queryset)
+        aliases = [
+            self.cursor_alias.format(number)
+            for number in range(len(self.ordering))
+        ]
+        # Ключи читаются через аннотации: так и фильтр курсора, и
+        # значения из результатов используют соединения сортировки.
+        queryset = queryset.annotate(
+            **{
+                alias: F(field.lstrip("-"))
+                for alias, field in zip(aliases, self.ordering)
+            }
+        )
+        position = self.decode_cursor(request)
+        if position:
+            try:
+                queryset = queryset.filter(self.seek(aliases, position))
+            except (DjangoValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        results = list(queryset[: limit + 1])
+        self.next_position = None
+        if len(results) > limit:
+            results = results[:limit]
+            self.next_position = [
+                getattr(results[-1], alias) for alias in aliases
+            ]
+        return results
+
+    def seek(self, aliases, position):
+        """Условие "после позиции" для сортировки self.ordering.
+
+        Первый ключ дополнительно ограничен нестрого, чтобы поиск
+        начинался с позиции по индексу.
+        """
+        directions = [
+            "lt" if field.startswith("-") else "gt" for field in self.ordering
+        ]
+        condition = Q()
+        for number, (alias, value) in enumerate(zip(aliases, position)):
+            condition |= Q(
+                **{
+                    previous: previous_value
+                    for previous, previous_value in zip(
+                        aliases[:number], position
+                    )
+                },
+                **{f"{alias}__{directions[number]}": value},
+            )
+        return condition & Q(
+            **{f"{aliases[0]}__{directions[0]}e": position[0]}
+        )
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(
+            {"next": self.get_next_cursor_link(), "results": data}
+        )
+
+    def get_next_cursor_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    def encode_cursor(self, position):
+        # str сохраняет микросекунды времени публикации.
+        raw = json.dumps([self.ordering, position], default=str)
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        """Возвращает значения ключей сортировки из курсора запроса.
+
+        Курсор, выданный для другой сортировки, неверен.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode()).decode()
+            ordering, position = json.loads(raw)
+            ordering = tuple(ordering)
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if (
+            ordering != self.ordering
+            or not isinstance(position, list)
+            or len(position) != len(self.ordering)
+            or not all(isinstance(value, (str, int)) for value in position)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position
@@ -0,0 +1,138 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+WARM_UP_HTML = "<p>Список покупок 0123456789</p>"
+
+# Состояние процесса рендеринга: шрифты и стили разбираются один раз
+# при запуске процесса и используются для всех его заданий.
+_font_config = None
+_stylesheets = None
+
+
+class PdfRenderUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Формирование PDF сейчас недоступно, повторите позже."
+    default_code = "pdf_render_unavailable"
+
+
+def warm_up(*stylesheets):
+    """Загружает WeasyPrint, шрифты и стили и рендерит пробный документ."""
+    global _font_config, _stylesheets
+    from weasyprint import CSS, HTML
+    from weasyprint.text.fonts import FontConfiguration
+
+    _font_config = FontConfiguration()
+    _stylesheets = [
+        CSS(string=stylesheet, font_config=_font_config)
+        for stylesheet in stylesheets
+    ]
+    HTML(string=WARM_UP_HTML).write_pdf(
+        stylesheets=_stylesheets, font_config=_font_config
+    )
+
+
+def render_pdf(html_content, stylesheets=()):
+    """Рендерит HTML в PDF с заранее разобранными стилями."""
+    if _stylesheets is None:
+        warm_up(*stylesheets)
+    from weasyprint import HTML
+
+    return HTML(string=html_content).write_pdf(
+        stylesheets=_stylesheets, font_config=_font_config
+    )
+
+
+class PdfRenderPool:
+    """Пул процессов для рендеринга PDF вне воркера gunicorn.
+
+    Процессы запускаются при первом задании и прогреваются warm_up.
+    После PDF_RENDER_MAX_TASKS заданий на процесс пул заменяется
+    новым, а старый завершается после текущих заданий, освобождая
+    память. Одновременно в пуле не больше PDF_RENDER_QUEUE_SIZE
+    заданий, остальные запросы ждут место не дольше
+    PDF_RENDER_TIMEOUT секунд. При PDF_RENDER_WORKERS = 0 PDF
+    рендерится в текущем процессе.
+    """
+
+    def __init__(self, *stylesheets):
+        self.stylesheets = stylesheets
+        self.lock = threading.Lock()
+        self.executor = None
+        self.submitted = 0
+        self.slots = None
+
+    def get_slots(self):
+        with self.lock:
+            if self.slots is None:
+                self.slots = threading.BoundedSemaphore(
+                    settings.PDF_RENDER_QUEUE_SIZE
+                )
+            return self.slots
+
+    def get_executor(self):
+        """Возвращает пул, заменяя его после исчерпания лимита заданий."""
+        workers = settings.PDF_RENDER_WORKERS
+        with self.lock:
+            if (
+                self.executor is None
+                or self.submitted >= workers * settings.PDF_RENDER_MAX_TASKS
+            ):
+                self.retire(self.executor)
+                self.executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=warm_up,
+                    initargs=self.stylesheets,
+                )
+                self.submitted = 0
+            self.submitted += 1
+            return self.executor
+
+    def retire(self, executor, terminate=False):
+        """Останавливает пул, не дожидаясь завершения его заданий.
+
+        При terminate процессы пула завершаются сразу, иначе
+        дорабатывают уже принятые задания.
+        """
+        if executor is None:
+            return
+        if terminate:
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False)
+
+    def render(self, html_content):
+        """Возвращает PDF документа в байтах.
+
+        Если пул занят или рендеринг не уложился в таймаут,
+        выбрасывает PdfRenderUnavailable.
+        """
+        if not settings.PDF_RENDER_WORKERS:
+            return render_pdf(html_content, self.stylesheets)
+        timeout = settings.PDF_RENDER_TIMEOUT
+        slots = self.get_slots()
+        if not slots.acquire(timeout=timeout):
+            raise PdfRenderUnavailable()
+        try:
+            executor = self.get_executor()
+            future = executor.submit(render_pdf, html_content)
+            try:
+                return future.result(timeout=timeout)
+            except (FutureTimeoutError, BrokenProcessPool):
+                # Зависший процесс нельзя прервать иначе, поэтому пул
+                # заменяется вместе со всеми его процессами.
+                with self.lock:
+                    if self.executor is executor:
+                        self.executor = None
+                self.retire(executor, terminate=True)
+                raise PdfRenderUnavailable()
+        finally:
+            slots.release()
@@ -0,0 +1,112 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db.models import (
+    BooleanField,
+    Count,
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Value,
+    Window,
+    prefetch_related_objects,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+from receipts.models import (
+    Favorite,
+    IngredientInRecipe,
+    Receipt,
+    ShoppingList,
+)
+
+
+User = get_user_model()
+
+
+def get_card_prefetches():
+    """Связи рецепта, нужные для сборки его карточки."""
+    return (
+        "tags",
+        Prefetch(
+            "ingredientinrecipe",
+            queryset=IngredientInRecipe.objects.select_related("ingredient"),
+        ),
+    )
+
+
+def prefetch_recipe_cards(recipes):
+    """Подгружает тэги и ингредиенты рецептов по одному запросу на связь.
+
+    Вызывается только для рецептов, карточек которых нет в кэше.
+    """
+    prefetch_related_objects(recipes, *get_card_prefetches())
+
+
+def get_recipes_queryset(user=None):
+    """Возвращает рецепты для полной репрезентации.
+
+    Автор подгружается через JOIN. Тэги и ингредиенты подгружаются
+    при сборке отсутствующих в кэше карточек (prefetch_recipe_cards).
+    Для авторизованного пользователя рецепты аннотируются флагами
+    избранного и списка покупок.
+    """
+    queryset = Receipt.objects.select_related("author")
+    if user is None or not user.is_authenticated:
+        return queryset
+    this_recipe = OuterRef("pk")
+    return queryset.annotate(
+        is_favorited=Exists(
+            Favorite.objects.filter(user=user, receipt=this_recipe)
+        ),
+        is_in_shopping_cart=Exists(
+            ShoppingList.objects.filter(user=user, receipt=this_recipe)
+        ),
+    )
+
+
+def get_subscriptions_queryset(user):
+    """Возвращает авторов, на которых подписан пользователь.
+
+    Количество рецептов считается в том же запросе, флаг подписки
+    истинен по построению queryset.
+    """
+    return User.objects.filter(followings__user=user).annotate(
+        recipes_count=Count("recipes", distinct=True),
+        is_subscribed=Value(True, output_field=BooleanField()),
+    )
+
+
+def attach_recipes_preview(authors, limit):
+    """Подгружает по limit последних рецептов каждого автора одним запросом.
+
+    Рецепты нумеруются оконной функцией ROW_NUMBER в разрезе автора,
+    результат сохраняется в атрибут recipes_preview каждого автора.
+    """
+    ranked = (
+        Receipt.objects.filter(author__in=authors)
+        .annotate(
+            position=Window(
+                expression=RowNumber(),
+                partition_by=F("author_id"),
+                order_by=(F("publish_time").desc(), F("id").desc()),
+            )
+        )
+        .order_by()
+        .values("id", "position")
+    )
+    sql, params = ranked.query.sql_with_params()
+    recipes = Receipt.objects.filter(
+        pk__in=RawSQL(
+            f"SELECT ranked.id FROM ({sql}) ranked "
+            "WHERE ranked.position <= %s",
+            (*params, limit),
+        )
+    )
+    previews = defaultdict(list)
+    for recipe in recipes:
+        previews[recipe.author_id].append(recipe)
+    for author in authors:
+        author.recipes_preview = previews[author.pk]
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+CARD_KEY = "recipe_card:v1:{}"
+
+
+def card_key(recipe_id):
+    return CARD_KEY.format(recipe_id)
+
+
+def get_cards(recipes, build_cards):
+    """Возвращает карточки рецептов из кэша.
+
+    Отсутствующие в кэше карточки собираются одним вызовом build_cards
+    и сохраняются одним запросом к кэшу.
+    """
+    keys = [card_key(recipe.pk) for recipe in recipes]
+    cards = cache.get_many(keys)
+    missing = [
+        (key, recipe)
+        for key, recipe in zip(keys, recipes)
+        if key not in cards
+    ]
+    if missing:
+        missing_keys, missing_recipes = zip(*missing)
+        built = dict(zip(missing_keys, build_cards(list(missing_recipes))))
+        cache.set_many(built, timeout=settings.RECIPE_CARD_CACHE_TIMEOUT)
+        cards.update(built)
+    return [cards[key] for key in keys]
+
+
+def invalidate_cards(recipe_ids):
+    """Удаляет из кэша карточки переданных рецептов.
+
+    Карточки удаляются сразу и повторно после коммита: чтение
+    до коммита вернуло бы в кэш старую карточку.
+    """
+    keys = [card_key(recipe_id) for recipe_id in recipe_ids]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
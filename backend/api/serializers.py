@@ -1,18 +1,31 @@
-import base64
 import re
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
-from django.core.files.base import ContentFile
 from django.core.validators import EmailValidator
+from django.db import models, transaction
 from django.forms import ValidationError
 from rest_framework import serializers
 
+from api.cart_totals import get_recipe_amounts, recipe_amounts_changed
+from api.fast_serializers import (
+    get_absolute_url,
+    recipe_basic_to_dict,
+    recipe_card_to_dict,
+)
+from api.feed import publish_to_feeds
+from api.images import decode_image
+from api.querysets import get_recipes_queryset, prefetch_recipe_cards
+from api.recipe_cards import get_cards
+from api.subscriptions import get_subscribed_ids
 from receipts.models import (
+    CartIngredientTotal,
     Ingredient,
     IngredientInRecipe,
     Tag,
     Receipt,
+    ShoppingListExport,
     MAX_COOKING_TIME,
     MAX_INGREDIENT_AMOUNT,
     MIN_COOKING_TIME,
@@ -33,14 +46,34 @@ User = get_user_model()
 RECIPES_IN_SUBSCRIPTION = 25
 
 
+def get_recipes_limit(request):
+    """Количество рецептов автора в подписке из параметра recipes_limit."""
+    if request is None:
+        return RECIPES_IN_SUBSCRIPTION
+    limit = request.query_params.get("recipes_limit")
+    if not limit:
+        return RECIPES_IN_SUBSCRIPTION
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise serializers.ValidationError(
+            {"recipes_limit": "Ожидается положительное целое число."}
+        )
+    return limit
+
+
 class Base64ImageField(serializers.ImageField):
-    """Декодирует строку base64 в файл изображения."""
+    """Декодирует строку base64 в файл изображения.
+
+    Строка декодируется по частям во временный файл с проверкой
+    размера, формата и разрешения, см. decode_image.
+    """
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-            data = ContentFile(base64.b64decode(imgstr), name="temp." + ext)
+            data = decode_image(data)
         return super().to_internal_value(data)
 
 
@@ -134,14 +167,11 @@ class MyUserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get("request", None)
-        if request:
-            current_user = request.user
-            if not current_user.is_authenticated:
-                return False
-            return obj.followings.filter(
-                user=current_user
-            ).exists()
-        return False
+        if not request or not request.user.is_authenticated:
+            return False
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
+        return obj.pk in get_subscribed_ids(request)
 
     def create(self, validated_data):
         validated_data["password"] = make_password(
@@ -243,16 +273,36 @@ class RecipeSerializerGetRequestBasic(serializers.ModelSerializer):
         model = Receipt
         fields = ("id", "name", "image", "cooking_time")
 
+    def to_representation(self, instance):
+        return recipe_basic_to_dict(instance, self.context.get("request"))
 
-class RecipeSerializerGetRequest(serializers.ModelSerializer):
-    """Сериализатор для полной репрезентации рецепта."""
 
-    author = MyUserSerializer(read_only=True)
+class AuthorCardSerializer(serializers.ModelSerializer):
+    """Сериализатор автора для кэшируемой карточки рецепта."""
+
+    class Meta:
+        model = User
+        fields = (
+            "id",
+            "username",
+            "email",
+            "first_name",
+            "last_name",
+            "avatar",
+        )
+
+
+class RecipeCardSerializer(serializers.ModelSerializer):
+    """Сериализатор независимой от пользователя части рецепта.
+
+    Для чтения используется recipe_card_to_dict с тем же форматом,
+    сериализатор остается эталоном формата карточки.
+    """
+
+    author = AuthorCardSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField()
     tags = TagSerializer(many=True, read_only=True)
     cooking_time = serializers.IntegerField(read_only=True)
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Receipt
@@ -260,8 +310,6 @@ class RecipeSerializerGetRequest(serializers.ModelSerializer):
             "id",
             "author",
             "tags",
-            "is_favorited",
-            "is_in_shopping_cart",
             "ingredients",
             "name",
             "image",
@@ -279,17 +327,116 @@ class RecipeSerializerGetRequest(serializers.ModelSerializer):
             data.append(ingredient_dict)
         return data
 
-    def get_is_favorited(self, obj):
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Сериализатор списка рецептов, собирающий карточки пачкой."""
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, models.Manager) else data
+        return self.child.represent_many(list(recipes))
+
+
+class RecipeSerializerGetRequest(RecipeCardSerializer):
+    """Сериализатор для полной репрезентации рецепта.
+
+    Независимая от пользователя часть берется из кэша карточек,
+    флаги текущего пользователя добавляются к ней при каждом запросе.
+    """
+
+    author = MyUserSerializer(read_only=True)
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
+
+    user_flags = ("is_favorited", "is_in_shopping_cart")
+
+    class Meta(RecipeCardSerializer.Meta):
+        fields = (
+            "id",
+            "author",
+            "tags",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "ingredients",
+            "name",
+            "image",
+            "text",
+            "cooking_time",
+        )
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.represent_many([instance])[0]
+
+    def represent_many(self, recipes):
+        """Возвращает репрезентации рецептов с флагами пользователя."""
+        cards = get_cards(recipes, self.build_cards)
+        flags = self.get_flags(recipes)
+        return [
+            self.merge_card(card, recipe, flags)
+            for card, recipe in zip(cards, recipes)
+        ]
+
+    def build_cards(self, recipes):
+        prefetch_recipe_cards(recipes)
+        return [recipe_card_to_dict(recipe) for recipe in recipes]
+
+    def get_flags(self, recipes):
+        """Собирает флаги пользователя для всех рецептов одним проходом.
+
+        Используются аннотации queryset, а при их отсутствии
+        по одному запросу на каждый флаг.
+        """
         request = self.context.get("request", None)
         if not request or not request.user.is_authenticated:
-            return False
-        return obj.favorites.filter(user=request.user).exists()
+            return None
+        user = request.user
+        recipe_ids = [recipe.pk for recipe in recipes]
+        return {
+            "is_favorited": self.get_flag_ids(
+                recipes,
+                "is_favorited",
+                user.favorites.filter(receipt_id__in=recipe_ids),
+                "receipt_id",
+            ),
+            "is_in_shopping_cart": self.get_flag_ids(
+                recipes,
+                "is_in_shopping_cart",
+                user.shopping_lists.filter(receipt_id__in=recipe_ids),
+                "receipt_id",
+            ),
+            "is_subscribed": get_subscribed_ids(request),
+        }
 
-    def get_is_in_shopping_cart(self, obj):
+    def get_flag_ids(self, recipes, annotation, queryset, field):
+        if all(hasattr(recipe, annotation) for recipe in recipes):
+            return {
+                recipe.pk for recipe in recipes if getattr(recipe, annotation)
+            }
+        return set(queryset.values_list(field, flat=True))
+
+    def merge_card(self, card, recipe, flags):
+        """Добавляет флаги пользователя к карточке рецепта."""
         request = self.context.get("request", None)
-        if not request or not request.user.is_authenticated:
-            return False
-        return obj.shopping_lists.filter(user=request.user).exists()
+        author = dict(card["author"])
+        author["is_subscribed"] = bool(
+            flags and recipe.author_id in flags["is_subscribed"]
+        )
+        author["avatar"] = get_absolute_url(request, author["avatar"])
+        data = {}
+        for name in self.Meta.fields:
+            if name in self.user_flags:
+                data[name] = bool(flags and recipe.pk in flags[name])
+            elif name == "author":
+                data[name] = {
+                    field: author[field]
+                    for field in MyUserSerializer.Meta.fields
+                    if field in author
+                }
+            elif name == "image":
+                data[name] = get_absolute_url(request, card[name])
+            else:
+                data[name] = card[name]
+        return data
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -351,20 +498,28 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags)
         ingredients_to_add = self.add_ingredients(recipe, ingredients)
         IngredientInRecipe.objects.bulk_create(ingredients_to_add)
+        publish_to_feeds(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновляет информацию в рецепте."""
+        """Обновляет информацию в рецепте и суммы ингредиентов
+        в списках покупок, в которых он есть."""
         ingredients = validated_data.pop("ingredients")
         ingredients_to_add = self.add_ingredients(
             recipe=instance, ingredients=ingredients
         )
+        old_amounts = get_recipe_amounts(instance.pk)
         instance.ingredientinrecipe.all().delete()
         IngredientInRecipe.objects.bulk_create(ingredients_to_add)
+        recipe_amounts_changed(instance.pk, old_amounts)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
-        serializer = RecipeSerializerGetRequest(instance)
+        request = self.context.get("request", None)
+        user = request.user if request else None
+        instance = get_recipes_queryset(user).get(pk=instance.pk)
+        serializer = RecipeSerializerGetRequest(instance, context=self.context)
         return serializer.data
 
 
@@ -379,18 +534,16 @@ class SubscribeUserSerializer(MyUserSerializer):
         fields = MyUserSerializer.Meta.fields + ("recipes", "recipes_count")
 
     def get_recipes(self, obj):
-        request = self.context.get("request", None)
-        if request:
-            limit = int(
-                request.query_params.get(
-                    "recipes_limit", RECIPES_IN_SUBSCRIPTION
-                )
-            )
-        return RecipeSerializerGetRequestBasic(
-            obj.recipes.all()[:limit], many=True
-        ).data
+        if hasattr(obj, "recipes_preview"):
+            recipes = obj.recipes_preview
+        else:
+            limit = get_recipes_limit(self.context.get("request", None))
+            recipes = obj.recipes.all()[:limit]
+        return RecipeSerializerGetRequestBasic(recipes, many=True).data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, "recipes_count"):
+            return obj.recipes_count
         return obj.recipes.count()
 
 
@@ -400,3 +553,40 @@ class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Receipt
         fields = ("recipe",)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массовых операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX_IDS,
+    )
+
+
+class ShoppingListExportSerializer(serializers.ModelSerializer):
+    """Сериализатор задания на выгрузку списка покупок."""
+
+    url = serializers.HyperlinkedIdentityField(
+        view_name="shopping_cart_export"
+    )
+
+    class Meta:
+        model = ShoppingListExport
+        fields = ("id", "status", "url", "created_at", "finished_at")
+
+
+class CartIngredientTotalSerializer(serializers.ModelSerializer):
+    """Сериализатор ингредиента в сводке списка покупок."""
+
+    id = serializers.IntegerField(source="ingredient.id")
+    name = serializers.CharField(source="ingredient.name")
+    measurement_unit = serializers.CharField(
+        source="ingredient.measurement_unit"
+    )
+    amount = serializers.IntegerField(source="total")
+
+    class Meta:
+        model = CartIngredientTotal
+        fields = ("id", "name", "measurement_unit", "amount")
@@ -1,27 +1,169 @@
+import csv
+import json
 import platform
-from io import BytesIO
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.html import escape
+from rest_framework.exceptions import NotAcceptable, ValidationError
 
-if platform.system() == "Linux":
-    from weasyprint import HTML
+from api.file_cache import FileCache, content_key
+from api.pdf_pool import PdfRenderPool
 
 
-def generate_html(result_list):
-    """HTML шаблон для списка покупок."""
-    html = """
+PDF_SUPPORTED = platform.system() == "Linux"
+# Формат, если клиент его не выбрал.
+DEFAULT_FORMAT = "pdf" if PDF_SUPPORTED else "html"
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "txt": "text/plain; charset=utf-8",
+    "json": "application/json",
+    "html": "text/html; charset=utf-8",
+    "pdf": "application/pdf",
+}
+# Размер куска потокового ответа в символах.
+STREAM_CHUNK_SIZE = 8192
+SHOPPING_LIST_CSS = """
+    body { font-family: Arial, sans-serif; margin: 20px; }
+    h1 { text-align: center; }
+    table { width: 100%; border-collapse: collapse; margin-top: 20px; }
+    th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+    th { background-color: #f2f2f2; }
+"""
+# Для PDF стили разбираются один раз в процессах пула, в HTML файл
+# они встраиваются.
+pdf_pool = PdfRenderPool(SHOPPING_LIST_CSS)
+file_cache = FileCache(
+    "SHOPPING_LIST_CACHE_ROOT", "SHOPPING_LIST_CACHE_MAX_BYTES"
+)
+
+
+def iter_summary_rows(user):
+    """Строки списка покупок по одной: ингредиенты корзины пользователя
+    с суммарным количеством, отсортированные по названию.
+
+    Суммы читаются из CartIngredientTotal без агрегации, строки
+    выбираются из базы курсором, а не загружаются все сразу.
+    """
+    totals = user.cart_totals.order_by("ingredient__name").values_list(
+        "ingredient__name", "ingredient__measurement_unit", "total"
+    )
+    for name, measurement_unit, total in totals.iterator():
+        yield {
+            "name": name,
+            "measurement_unit": measurement_unit,
+            "total_ingredients": total,
+        }
+
+
+def get_summary_rows(user):
+    """Возвращает строки списка покупок списком."""
+    return list(iter_summary_rows(user))
+
+
+def choose_format(request):
+    """Формат файла из параметра format или заголовка Accept.
+
+    Из Accept берется первый по весу тип, который поддерживается;
+    */* и отсутствие заголовка дают формат по умолчанию.
+    """
+    file_format = request.query_params.get("format")
+    if file_format is not None:
+        if file_format not in CONTENT_TYPES:
+            raise ValidationError(
+                {
+                    "format": (
+                        "Поддерживаются форматы: "
+                        f"{', '.join(CONTENT_TYPES)}."
+                    )
+                }
+            )
+        return file_format
+    media_types = {
+        content_type.split(";")[0]: file_format
+        for file_format, content_type in CONTENT_TYPES.items()
+    }
+    accepted = []
+    for position, item in enumerate(
+        request.META.get("HTTP_ACCEPT", "*/*").split(",")
+    ):
+        media_type, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.append((-quality, position, media_type))
+    for _, _, media_type in sorted(accepted):
+        if media_type == "*/*":
+            return DEFAULT_FORMAT
+        if media_type in media_types:
+            return media_types[media_type]
+    raise NotAcceptable()
+
+
+def write_csv(rows):
+    """Строки CSV: заголовок и ингредиенты."""
+
+    class Line:
+        def write(self, value):
+            return value
+
+    writer = csv.writer(Line())
+    yield writer.writerow(("Ингредиент", "Единица измерения", "Количество"))
+    for item in rows:
+        yield writer.writerow(
+            (
+                item["name"],
+                item["measurement_unit"],
+                item["total_ingredients"],
+            )
+        )
+
+
+def write_txt(rows):
+    """Строки текстового списка покупок."""
+    yield "Список покупок\n\n"
+    for i, item in enumerate(rows, start=1):
+        yield (
+            f"{i}. {item['name']} ({item['measurement_unit']}) - "
+            f"{item['total_ingredients']}\n"
+        )
+
+
+def write_json(rows):
+    """JSON массив ингредиентов по одному элементу."""
+    separator = ""
+    yield "["
+    for item in rows:
+        yield separator + json.dumps(
+            {
+                "name": item["name"],
+                "measurement_unit": item["measurement_unit"],
+                "amount": item["total_ingredients"],
+            },
+            ensure_ascii=False,
+        )
+        separator = ","
+    yield "]"
+
+
+def write_html(rows, styles=True):
+    """HTML шаблон для списка покупок по частям.
+
+    Без styles стили не встраиваются: для PDF их добавляет пул.
+    """
+    style = f"<style>{SHOPPING_LIST_CSS}</style>" if styles else ""
+    yield f"""
     <!DOCTYPE html>
     <html lang="ru">
     <head>
         <meta charset="UTF-8">
         <title>Список покупок</title>
-        <style>
-            body { font-family: Arial, sans-serif; margin: 20px; }
-            h1 { text-align: center; }
-            table { width: 100%; border-collapse: collapse; margin-top: 20px; }
-            th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
-            th { background-color: #f2f2f2; }
-        </style>
+        {style}
     </head>
     <body>
         <h1>Список покупок</h1>
@@ -33,43 +175,101 @@ def generate_html(result_list):
                 <th>Количество</th>
             </tr>
     """
-    for i, item in enumerate(result_list, start=1):
-        html += f"""
+    for i, item in enumerate(rows, start=1):
+        yield f"""
             <tr>
                 <td>{i}</td>
-                <td>{item['name']}</td>
-                <td>{item['measurement_unit']}</td>
+                <td>{escape(item['name'])}</td>
+                <td>{escape(item['measurement_unit'])}</td>
                 <td>{item['total_ingredients']}</td>
             </tr>
         """
-    html += """
+    yield """
         </table>
     </body>
     </html>
     """
-    return html
 
 
-def generate_file(html_content):
-    """Возвращает PDF файл или html текст в зависимости от платформы."""
-    if platform.system() == "Linux":
-        pdf_file = BytesIO()
-        HTML(string=html_content).write_pdf(pdf_file)
-        pdf_file.seek(0)
-        return pdf_file
-    return html_content
+WRITERS = {
+    "csv": write_csv,
+    "txt": write_txt,
+    "json": write_json,
+    "html": write_html,
+}
 
 
-def get_file(file):
-    """Возвращает ответ с файлом PDF или HTML в зависимости от платформы."""
-    if platform.system() == "Linux":
-        response = HttpResponse(file, content_type="application/pdf")
-        response["Content-Disposition"] = (
-            'attachment; filename="shopping_list.pdf"'
-        )
-        return response
-    response = HttpResponse(file, content_type="text/html")
+def generate_html(result_list, styles=True):
+    """HTML документ списка покупок целиком."""
+    return "".join(write_html(result_list, styles))
+
+
+def generate_file(html_content, file_format=DEFAULT_FORMAT):
+    """Возвращает PDF файл или html документ в байтах."""
+    if file_format == "pdf":
+        return pdf_pool.render(html_content)
+    return html_content.encode()
+
+
+def get_cached_file(result_list, file_format=DEFAULT_FORMAT):
+    """Возвращает файл списка покупок в байтах из кэша или рендерит его.
+
+    Ключ - хэш HTML документа, который зависит только от строк списка
+    и шаблона, поэтому одинаковые списки разных пользователей делят
+    один файл, а изменение шаблона не отдает устаревшие файлы.
+    """
+    if file_format == "pdf" and not PDF_SUPPORTED:
+        raise NotAcceptable("PDF на этой платформе не формируется.")
+    html_content = generate_html(result_list, styles=file_format != "pdf")
+    key = content_key(file_format, html_content)
+    content = file_cache.get(key)
+    if content is None:
+        content = generate_file(html_content, file_format)
+        file_cache.set(key, content)
+    return content
+
+
+def attachment(response, file_format):
     response["Content-Disposition"] = (
-        'attachment; filename="shopping_list.html"'
+        f'attachment; filename="shopping_list.{file_format}"'
     )
     return response
+
+
+def get_file(file, file_format=DEFAULT_FORMAT):
+    """Возвращает ответ с готовым файлом списка покупок."""
+    return attachment(
+        HttpResponse(file, content_type=CONTENT_TYPES[file_format]),
+        file_format,
+    )
+
+
+def join_chunks(parts, size=STREAM_CHUNK_SIZE):
+    """Склеивает мелкие части в куски не меньше size символов."""
+    buffer = []
+    length = 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield "".join(buffer).encode()
+            buffer = []
+            length = 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def stream_file(user, file_format):
+    """Потоковый ответ со списком покупок в текстовом формате.
+
+    Строки читаются из базы по мере отправки, поэтому память
+    не растет с размером списка.
+    """
+    rows = iter_summary_rows(user)
+    return attachment(
+        StreamingHttpResponse(
+            join_chunks(WRITERS[file_format](rows)),
+            content_type=CONTENT_TYPES[file_format],
+        ),
+        file_format,
+    )
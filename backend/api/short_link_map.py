@@ -0,0 +1,88 @@
+import hashlib
+import re
+from pathlib import Path
+
+from django.conf import settings
+
+from api.snapshots import write_file
+from receipts.models import Receipt
+from shortlink.models import ShortLink
+from shortlink.short_link import RECIPE_URL, encode_recipe_id
+
+
+MAP_HEADER = "# salt {}, last recipe {}\n"
+MAP_HEADER_PATTERN = re.compile(r"^# salt (\w+), last recipe (\d+)$")
+MAP_ENTRY = '{code} "{code} {url}";\n'
+
+
+def salt_digest():
+    # Соль в карте не раскрывается, хранится только ее хэш.
+    return hashlib.sha256(settings.SHORT_LINK_SALT.encode()).hexdigest()[:12]
+
+
+def read_map(path):
+    """Разбирает карту, записанную write_short_link_map.
+
+    Возвращает id последнего выгруженного рецепта и строки записей.
+    Если карты нет или она выгружена с другой SHORT_LINK_SALT,
+    возвращает (0, []), и карта собирается заново.
+    """
+    try:
+        header, *entries = path.read_text().splitlines(keepends=True)
+    except (FileNotFoundError, ValueError):
+        return 0, []
+    match = MAP_HEADER_PATTERN.match(header.strip())
+    if match is None or match[1] != salt_digest():
+        return 0, []
+    return int(match[2]), entries
+
+
+def iter_recipe_batches(after, batch_size):
+    """id рецептов больше after пачками по batch_size."""
+    recipes = Receipt.objects.filter(pk__gt=after).order_by("pk")
+    while True:
+        batch = list(recipes.values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        recipes = recipes.filter(pk__gt=batch[-1])
+
+
+def write_short_link_map(full=False, batch_size=1000):
+    """Создает короткие ссылки новых рецептов и дописывает их в карту nginx.
+
+    Обрабатываются только рецепты с id больше записанного в заголовке
+    карты, при full карта собирается с нуля. Строки ShortLink
+    создаются пачками bulk_create, существующие не меняются. Ключи
+    map в nginx не различают регистр, поэтому код, совпадающий
+    с уже выгруженным без учета регистра, пропускается: такие ссылки
+    по-прежнему разбирает бэкенд. Возвращает число добавленных
+    и пропущенных ссылок.
+    """
+    path = Path(settings.SHORT_LINK_MAP_PATH)
+    last_recipe, entries = (0, []) if full else read_map(path)
+    codes = {entry.split(" ", 1)[0].lower() for entry in entries}
+    added = skipped = 0
+    for batch in iter_recipe_batches(last_recipe, batch_size):
+        links = [
+            ShortLink(
+                full_url=RECIPE_URL.format(pk),
+                short_link=encode_recipe_id(pk),
+            )
+            for pk in batch
+        ]
+        ShortLink.objects.bulk_create(links, ignore_conflicts=True)
+        for link in links:
+            if link.short_link.lower() in codes:
+                skipped += 1
+                continue
+            codes.add(link.short_link.lower())
+            entries.append(
+                MAP_ENTRY.format(code=link.short_link, url=link.full_url)
+            )
+            added += 1
+        last_recipe = batch[-1]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    content = MAP_HEADER.format(salt_digest(), last_recipe)
+    write_file(path, (content + "".join(entries)).encode())
+    return added, skipped
@@ -0,0 +1,177 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.cart_totals import add_recipe_to_carts, remove_recipe_from_carts
+from api.counters import change_counters
+from api.feed import backfill_feed, remove_from_feed
+from api.fuzzy_search import uses_pg_trgm
+from api.recipe_cards import invalidate_cards
+from api.snapshots import write_snapshot
+from api.versions import INGREDIENTS, RECIPES, TAGS, bump_version
+from receipts.models import (
+    Favorite,
+    Follow,
+    Ingredient,
+    IngredientInRecipe,
+    Receipt,
+    ShoppingList,
+    Tag,
+)
+
+
+User = get_user_model()
+RecipeTag = Receipt.tags.through
+
+
+def recipes_changed(recipe_ids):
+    """Сбрасывает карточки рецептов и обновляет время их изменения."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    invalidate_cards(recipe_ids)
+    Receipt.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=Receipt)
+@receiver(post_delete, sender=Receipt)
+def invalidate_recipe_card(sender, instance, **kwargs):
+    invalidate_cards((instance.pk,))
+
+
+def recipe_renaming(sender, instance, update_fields=None, **kwargs):
+    """Сравнивает сохраняемое название рецепта с названием в базе.
+
+    Запрос выполняется только для существующего рецепта и только
+    если название сохраняется, то есть при update_fields None или
+    содержащем name.
+    """
+    instance._renamed = (
+        not instance._state.adding
+        and (update_fields is None or "name" in update_fields)
+        and not Receipt.objects.filter(
+            pk=instance.pk, name=instance.name
+        ).exists()
+    )
+
+
+def recipe_name_saved(sender, instance, created, **kwargs):
+    """Индекс триграмм названий рецептов пересобирается, только если
+    рецепт создан или его название изменилось."""
+    if created or instance.__dict__.pop("_renamed", False):
+        bump_version(RECIPES)
+
+
+def recipe_deleted(sender, instance, **kwargs):
+    bump_version(RECIPES)
+
+
+# Индекс триграмм названий рецептов в памяти нужен только без pg_trgm.
+if not uses_pg_trgm():
+    pre_save.connect(recipe_renaming, sender=Receipt)
+    post_save.connect(recipe_name_saved, sender=Receipt)
+    post_delete.connect(recipe_deleted, sender=Receipt)
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def ingredient_in_recipe_changed(sender, instance, **kwargs):
+    recipes_changed((instance.recipe_id,))
+
+
+@receiver(post_delete, sender=RecipeTag)
+def recipe_tag_deleted(sender, instance, **kwargs):
+    recipes_changed((instance.receipt_id,))
+
+
+@receiver(m2m_changed, sender=RecipeTag)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        recipes_changed((instance.pk,))
+    elif pk_set:
+        recipes_changed(pk_set)
+    else:
+        recipes_changed(
+            Receipt.objects.filter(tags=instance).values_list("pk", flat=True)
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    bump_version(TAGS)
+    transaction.on_commit(lambda: write_snapshot(TAGS))
+    recipes_changed(
+        Receipt.objects.filter(tags=instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    bump_version(INGREDIENTS)
+    transaction.on_commit(lambda: write_snapshot(INGREDIENTS))
+    recipes_changed(
+        Receipt.objects.filter(
+            ingredientinrecipe__ingredient=instance
+        ).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def author_changed(sender, instance, **kwargs):
+    if kwargs.get("update_fields") == frozenset(("last_login",)):
+        return
+    recipes_changed(
+        Receipt.objects.filter(author=instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        backfill_feed(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    remove_from_feed(instance.user_id, instance.following_id)
+
+
+@receiver(post_save, sender=ShoppingList)
+def shopping_list_created(sender, instance, created, **kwargs):
+    if created:
+        add_recipe_to_carts((instance.user_id,), instance.receipt_id)
+        change_counters(ShoppingList, (instance.receipt_id,), 1)
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def shopping_list_deleted(sender, instance, **kwargs):
+    # pre_delete вызывается до каскадного удаления ингредиентов рецепта,
+    # поэтому при удалении рецепта его количества еще доступны.
+    remove_recipe_from_carts((instance.user_id,), instance.receipt_id)
+    change_counters(ShoppingList, (instance.receipt_id,), -1)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(sender, instance, created, **kwargs):
+    if created:
+        change_counters(Favorite, (instance.receipt_id,), 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    change_counters(Favorite, (instance.receipt_id,), -1)
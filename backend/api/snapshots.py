@@ -0,0 +1,159 @@
+import gzip
+import os
+from pathlib import Path
+
+import brotli
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import IngredientSerializer, TagSerializer
+from api.versions import INGREDIENTS, TAGS, get_version
+from receipts.models import Ingredient, Tag
+
+
+CATALOGUES = {
+    TAGS: (Tag, TagSerializer),
+    INGREDIENTS: (Ingredient, IngredientSerializer),
+}
+# Расширение файла и заголовок Content-Encoding в порядке предпочтения.
+ENCODINGS = (
+    ("br", ".br", lambda content: brotli.compress(content, quality=11)),
+    ("gzip", ".gz", lambda content: gzip.compress(content, 9, mtime=0)),
+)
+
+_snapshots = {}
+
+
+def snapshot_name(name, version=None):
+    """Имя файла снимка: версионное или последнее (без версии)."""
+    if version is None:
+        return f"{name}.json"
+    return f"{name}.v{version}.json"
+
+
+def render_catalogue(name):
+    """JSON справочника в том же виде, что и ответ API без фильтров."""
+    model, serializer_class = CATALOGUES[name]
+    return JSONRenderer().render(
+        serializer_class(model.objects.all(), many=True).data
+    )
+
+
+def write_file(path, content):
+    """Записывает файл атомарно, чтобы nginx не отдал его частично."""
+    temporary = path.with_name(f".{path.name}.tmp")
+    temporary.write_bytes(content)
+    os.replace(temporary, path)
+
+
+def write_snapshot(name, publish=True):
+    """Сохраняет снимок текущей версии справочника и его сжатые варианты.
+
+    При publish рядом пишется копия без версии в имени, которую
+    отдает nginx, а устаревшие версии удаляются. Возвращает словарь
+    с содержимым по кодировкам.
+    """
+    root = Path(settings.CATALOGUE_SNAPSHOT_ROOT)
+    root.mkdir(parents=True, exist_ok=True)
+    version, _ = get_version(name)
+    content = render_catalogue(name)
+    variants = {None: content}
+    for encoding, _, compress in ENCODINGS:
+        variants[encoding] = compress(content)
+    current = snapshot_name(name, version)
+    file_names = (current, snapshot_name(name)) if publish else (current,)
+    for encoding, suffix, _ in ((None, "", None), *ENCODINGS):
+        for file_name in file_names:
+            write_file(root / f"{file_name}{suffix}", variants[encoding])
+    if publish:
+        for path in root.glob(f"{name}.v*.json*"):
+            if not path.name.startswith(current):
+                path.unlink(missing_ok=True)
+    return variants
+
+
+def get_snapshot(name):
+    """Возвращает варианты снимка текущей версии справочника.
+
+    Снимок читается с диска один раз на версию, отсутствующий
+    снимок создается.
+    """
+    version = get_version(name)
+    key = (name, settings.CATALOGUE_SNAPSHOT_ROOT)
+    cached = _snapshots.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    root = Path(settings.CATALOGUE_SNAPSHOT_ROOT)
+    path = root / snapshot_name(name, version[0])
+    try:
+        variants = {None: path.read_bytes()}
+        for encoding, suffix, _ in ENCODINGS:
+            variants[encoding] = path.with_name(
+                path.name + suffix
+            ).read_bytes()
+    except FileNotFoundError:
+        variants = write_snapshot(name, publish=False)
+    _snapshots[key] = (version, variants)
+    return variants
+
+
+def parse_accept_encoding(header):
+    """Словарь {кодировка: q} из заголовка Accept-Encoding."""
+    weights = {}
+    for item in header.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.lower()] = weight
+    return weights
+
+
+def choose_encoding(request):
+    """Кодировка снимка по Accept-Encoding или None для несжатого.
+
+    Выбирается кодировка с наибольшим q, при равных - первая
+    в ENCODINGS. "*" задает q для не названных кодировок, q=0
+    запрещает кодировку. Несжатый вариант выбирается, если identity
+    указан с большим q, чем у сжатых.
+    """
+    weights = parse_accept_encoding(
+        request.META.get("HTTP_ACCEPT_ENCODING", "")
+    )
+    default = weights.get("*", 0.0)
+    chosen, chosen_weight = None, 0.0
+    for encoding, _, _ in ENCODINGS:
+        weight = weights.get(encoding, default)
+        if weight > chosen_weight:
+            chosen, chosen_weight = encoding, weight
+    if weights.get("identity", 0.0) > chosen_weight:
+        return None
+    return chosen
+
+
+def snapshot_response(request, name):
+    """Ответ со снимком справочника в кодировке, которую принимает клиент.
+
+    Возвращает None, если запрос с параметрами или не в JSON,
+    тогда ответ собирается сериализатором.
+    """
+    if request.query_params or request.accepted_renderer.format != "json":
+        return None
+    variants = get_snapshot(name)
+    encoding = choose_encoding(request)
+    response = HttpResponse(
+        variants[encoding], content_type="application/json"
+    )
+    if encoding is not None:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
@@ -0,0 +1,16 @@
+def get_subscribed_ids(request):
+    """Возвращает id авторов, на которых подписан текущий пользователь.
+
+    Множество загружается одним запросом и хранится на объекте запроса,
+    так что все сериализаторы пользователей в рамках запроса отвечают
+    на is_subscribed без обращения к базе.
+    """
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    subscribed_ids = getattr(request, "_subscribed_author_ids", None)
+    if subscribed_ids is None:
+        subscribed_ids = set(
+            request.user.followers.values_list("following_id", flat=True)
+        )
+        request._subscribed_author_ids = subscribed_ids
+    return subscribed_ids
@@ -8,6 +8,7 @@ from api.views import (
     UserViewSet,
     RecipeViewSet,
     ShoppingListDownload,
+    ShoppingListExportDownload,
 )
 
 
@@ -19,6 +20,11 @@ router.register(r"users", UserViewSet)
 
 urlpatterns = [
     path("recipes/download_shopping_cart/", ShoppingListDownload.as_view()),
+    path(
+        "recipes/download_shopping_cart/<uuid:pk>/",
+        ShoppingListExportDownload.as_view(),
+        name="shopping_cart_export",
+    ),
     path("", include(router.urls)),
     path("auth/", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
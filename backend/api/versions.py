@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from receipts.models import CatalogueVersion
+
+
+TAGS = "tag"
+INGREDIENTS = "ingredient"
+RECIPES = "recipe"
+VERSION_KEY = "catalogue_version:{}"
+
+
+def get_version(name):
+    """Возвращает версию справочника и время его последнего изменения."""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        catalogue, _ = CatalogueVersion.objects.get_or_create(name=name)
+        version = (catalogue.version, catalogue.updated_at)
+        cache.set(
+            key, version, timeout=settings.CATALOGUE_VERSION_CACHE_TIMEOUT
+        )
+    return version
+
+
+def bump_version(name):
+    """Увеличивает версию справочника после его изменения.
+
+    Версия удаляется из кэша сразу и повторно после коммита, чтобы
+    не оставить в кэше значение, прочитанное до коммита.
+    """
+    key = VERSION_KEY.format(name)
+    CatalogueVersion.objects.get_or_create(name=name)
+    CatalogueVersion.objects.filter(name=name).update(
+        version=F("version") + 1, updated_at=timezone.now()
+    )
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
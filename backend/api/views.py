@@ -3,25 +3,57 @@ import os
 from django.core.files.storage import default_storage
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
 from djoser import views as djoser_views
 from rest_framework.response import Response
 from rest_framework import viewsets, generics
 from rest_framework import status
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (
     IsAuthenticated,
     AllowAny,
     IsAuthenticatedOrReadOnly,
 )
 
-from api.paginators import LimitPagination
-from api.filters import IngredientsFilter, RecipesFilter
+from api.bulk import bulk_add, bulk_remove
+from api.conditional import catalogue_condition, recipe_condition
+from api.paginators import LimitPagination, RecipePagination
+from api.feed import backfill_feed, get_feed_queryset, remove_from_feed
+from api.filters import (
+    IngredientsFilter,
+    RecipeOrderingFilter,
+    RecipesFilter,
+)
+from api.ingredient_index import get_ingredient_index
+from api.links import (
+    delete_links,
+    insert_link,
+    links_added,
+    links_removed,
+)
 from api.permissions import IsAuthorOrReadOnly
-from api.shopping_list import generate_html, generate_file, get_file
+from api.querysets import (
+    attach_recipes_preview,
+    get_recipes_queryset,
+    get_subscriptions_queryset,
+)
+from api.exports import create_export, export_response
+from api.shopping_list import (
+    WRITERS,
+    choose_format,
+    get_cached_file,
+    get_file,
+    get_summary_rows,
+    stream_file,
+)
+from api.snapshots import snapshot_response
 from api.serializers import (
+    CartIngredientTotalSerializer,
     TagSerializer,
     IngredientSerializer,
     RecipeSerializer,
@@ -29,13 +61,18 @@ from api.serializers import (
     UserAvatarSerializer,
     SubscribeUserSerializer,
     RecipeSerializerGetRequestBasic,
+    RecipeIdsSerializer,
+    ShoppingListExportSerializer,
+    get_recipes_limit,
 )
+from api.versions import INGREDIENTS, TAGS
 from receipts.models import (
     Tag,
     Receipt,
     Ingredient,
     Follow,
     ShoppingList,
+    ShoppingListExport,
     Favorite,
 )
 from shortlink import short_link
@@ -44,35 +81,85 @@ from shortlink import short_link
 User = get_user_model()
 
 
+@method_decorator(catalogue_condition(TAGS), name="list")
+@method_decorator(catalogue_condition(TAGS), name="retrieve")
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """Список без параметров отдается готовым снимком справочника."""
+        return snapshot_response(request, TAGS) or super().list(
+            request, *args, **kwargs
+        )
+
 
+@method_decorator(catalogue_condition(INGREDIENTS), name="list")
+@method_decorator(catalogue_condition(INGREDIENTS), name="retrieve")
 class IngredientRetrieveList(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     permission_classes = (AllowAny,)
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientsFilter
-    filterset_fields = ("name",)
+    filterset_fields = ("name", "search")
     pagination_class = None
 
+    def get_limit(self, request):
+        """Ограничение числа результатов из параметра limit или None."""
+        limit = request.query_params.get("limit")
+        if not limit:
+            return None
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = -1
+        if limit < 0:
+            raise ValidationError(
+                {"limit": "Ожидается неотрицательное целое число."}
+            )
+        return limit
+
+    def list(self, request, *args, **kwargs):
+        """Поиск по названию отвечает из индекса в памяти без базы,
+        список без параметров - готовым снимком справочника. Вместе
+        с другими фильтрами поиск идет через IngredientsFilter."""
+        name = request.query_params.get("name")
+        limit = self.get_limit(request)
+        if name is not None and not any(
+            field in request.query_params
+            for field in self.filterset_fields
+            if field != "name"
+        ):
+            return Response(get_ingredient_index().search(name, limit=limit))
+        response = snapshot_response(request, INGREDIENTS)
+        if response is not None:
+            return response
+        queryset = self.filter_queryset(self.get_queryset())[:limit]
+        return Response(self.get_serializer(queryset, many=True).data)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Receipt.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipesFilter
+    ordering_fields = ("favorites_count", "in_carts_count", "publish_time")
     filterset_fields = (
         "author",
         "tags",
         "is_favorited",
         "is_in_shopping_cart",
+        "search",
     )
-    pagination_class = LimitPagination
+    pagination_class = RecipePagination
+
+    def get_queryset(self):
+        """Возвращает рецепты со связанными данными и флагами
+        текущего пользователя, чтобы не делать запросы на каждый рецепт."""
+        return get_recipes_queryset(self.request.user)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -86,13 +173,36 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeSerializerGetRequest
         return RecipeSerializer
 
+    @method_decorator(recipe_condition)
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+    @action(
+        detail=False,
+        methods=("get",),
+        url_path="feed",
+        url_name="feed",
+        permission_classes=(IsAuthenticated,),
+    )
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь."""
+        page = self.paginate_queryset(get_feed_queryset(request.user))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, url_path="favorite", methods=("post", "delete"))
     def post_delete_favorite_recipe(self, request, pk):
         this_recipe = get_object_or_404(Receipt, pk=pk)
+        recipes = (this_recipe.pk,)
         if request.method == "POST":
-            favorited, created = Favorite.objects.get_or_create(
-                user=request.user, receipt=this_recipe
-            )
+            with transaction.atomic():
+                created = insert_link(
+                    Favorite, user=request.user.pk, receipt=this_recipe.pk
+                )
+                if created:
+                    links_added(Favorite, request.user.pk, recipes)
             if not created:
                 return Response(
                     {
@@ -108,8 +218,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_201_CREATED,
             )
         if request.method == "DELETE":
-            favorited = request.user.favorites.filter(receipt=this_recipe)
-            if not favorited.exists():
+            with transaction.atomic():
+                deleted = delete_links(
+                    Favorite, user=request.user.pk, receipt=this_recipe.pk
+                )
+                if deleted:
+                    links_removed(Favorite, request.user.pk, recipes)
+            if not deleted:
                 return Response(
                     {
                         "favorite": (
@@ -119,16 +234,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     },
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            favorited.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, url_path="shopping_cart", methods=("post", "delete"))
     def shopping_list_add_remove_recipe(self, request, pk):
+        """Суммы ингредиентов корзины и счетчик рецепта меняются только
+        если строка действительно добавлена или удалена, поэтому
+        повторный параллельный запрос их не искажает."""
         this_recipe = get_object_or_404(Receipt, pk=pk)
+        recipes = (this_recipe.pk,)
         if request.method == "POST":
-            shopping, created = ShoppingList.objects.get_or_create(
-                user=request.user, receipt=this_recipe
-            )
+            with transaction.atomic():
+                created = insert_link(
+                    ShoppingList, user=request.user.pk, receipt=this_recipe.pk
+                )
+                if created:
+                    links_added(ShoppingList, request.user.pk, recipes)
             if not created:
                 return Response(
                     {
@@ -144,8 +265,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_201_CREATED,
             )
         if request.method == "DELETE":
-            shopping = request.user.shopping_lists.filter(receipt=this_recipe)
-            if not shopping.exists():
+            with transaction.atomic():
+                deleted = delete_links(
+                    ShoppingList, user=request.user.pk, receipt=this_recipe.pk
+                )
+                if deleted:
+                    links_removed(ShoppingList, request.user.pk, recipes)
+            if not deleted:
                 return Response(
                     {
                         "shopping_cart": (
@@ -155,9 +281,53 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     },
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            shopping.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def bulk_update_list(self, request, model):
+        """Добавляет (POST) или убирает (DELETE) несколько рецептов
+        и возвращает результат по каждому id."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        bulk = bulk_add if request.method == "POST" else bulk_remove
+        return Response(
+            {
+                "results": bulk(
+                    model, request.user, serializer.validated_data["ids"]
+                )
+            }
+        )
+
+    @action(
+        detail=False,
+        url_path="favorite/bulk",
+        methods=("post", "delete"),
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_update_list(request, Favorite)
+
+    @action(
+        detail=False,
+        url_path="shopping_cart/bulk",
+        methods=("post", "delete"),
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_update_list(request, ShoppingList)
+
+    @action(
+        detail=False,
+        url_path="shopping_cart/summary",
+        methods=("get",),
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_summary(self, request):
+        """Сводка списка покупок по готовым суммам ингредиентов."""
+        totals = request.user.cart_totals.select_related(
+            "ingredient"
+        ).order_by("ingredient__name")
+        return Response(CartIngredientTotalSerializer(totals, many=True).data)
+
     @action(
         detail=True,
         methods=("get",),
@@ -165,8 +335,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_name="get_short_link",
     )
     def get_short_link(self, request, pk):
-        get_object_or_404(Receipt, pk=pk)
-        short = short_link.get_or_create_short_link(f"/recipes/{pk}")
+        recipe = get_object_or_404(Receipt, pk=pk)
+        short = short_link.get_recipe_short_link(recipe.pk)
         return Response(
             {"short-link": request.build_absolute_uri(f"/s/{short}")},
             status=status.HTTP_200_OK,
@@ -178,7 +348,9 @@ class RecipeEdit(generics.RetrieveAPIView):
     permission_classes = (IsAuthorOrReadOnly,)
 
     def get_object(self):
-        return get_object_or_404(Receipt, self.kwargs.get("pk"))
+        return get_object_or_404(
+            get_recipes_queryset(self.request.user), pk=self.kwargs.get("pk")
+        )
 
 
 class UserViewSet(djoser_views.UserViewSet):
@@ -198,11 +370,16 @@ class UserViewSet(djoser_views.UserViewSet):
         context["request"] = self.request
         return context
 
-    def pagination_for_query(self, request, queryset, serializer_to_use):
-        """Вспомогательный метод пагинации списка объектов query."""
+    def pagination_for_query(
+        self, request, queryset, serializer_to_use, prepare_page=None
+    ):
+        """Вспомогательный метод пагинации списка объектов query.
+        prepare_page подгружает данные для всех объектов страницы сразу."""
         queryset = self.filter_queryset(queryset)
         page = self.paginate_queryset(queryset)
         if page:
+            if prepare_page:
+                prepare_page(page)
             serializer = serializer_to_use(
                 context={"request": request}, instance=page, many=True
             )
@@ -225,10 +402,12 @@ class UserViewSet(djoser_views.UserViewSet):
         permission_classes=(IsAuthenticated,),
     )
     def get_my_subscriptions(self, request):
+        limit = get_recipes_limit(request)
         return self.pagination_for_query(
             request=request,
-            queryset=User.objects.filter(followings__user=request.user).all(),
+            queryset=get_subscriptions_queryset(request.user),
             serializer_to_use=SubscribeUserSerializer,
+            prepare_page=lambda page: attach_recipes_preview(page, limit),
         )
 
     @action(
@@ -241,14 +420,21 @@ class UserViewSet(djoser_views.UserViewSet):
     def subscribe_unsubscribe(self, request, id):
         user_to_subscribe = get_object_or_404(User, pk=id)
         if request.method == "POST":
+            # Параметр проверяется до подписки, а не при выводе ответа.
+            get_recipes_limit(request)
             if user_to_subscribe == request.user:
                 return Response(
                     {"subscription": "Нельзя подписаться на самого себя."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            subscription, created = Follow.objects.get_or_create(
-                user=request.user, following=user_to_subscribe
-            )
+            with transaction.atomic():
+                created = insert_link(
+                    Follow,
+                    user=request.user.pk,
+                    following=user_to_subscribe.pk,
+                )
+                if created:
+                    backfill_feed(request.user.pk, user_to_subscribe.pk)
             if not created:
                 return Response(
                     {
@@ -264,10 +450,15 @@ class UserViewSet(djoser_views.UserViewSet):
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == "DELETE":
-            subscription = user_to_subscribe.followings.filter(
-                user=request.user
-            ).all()
-            if not subscription.exists():
+            with transaction.atomic():
+                deleted = delete_links(
+                    Follow,
+                    user=request.user.pk,
+                    following=user_to_subscribe.pk,
+                )
+                if deleted:
+                    remove_from_feed(request.user.pk, user_to_subscribe.pk)
+            if not deleted:
                 return Response(
                     {
                         "subscription": (
@@ -277,7 +468,6 @@ class UserViewSet(djoser_views.UserViewSet):
                     },
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            subscription.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -308,42 +498,59 @@ class UserViewSet(djoser_views.UserViewSet):
 
 class ShoppingListDownload(generics.RetrieveAPIView):
     """Возвращает файл со списком покупок.
-    PDF для Linux и HTML для остальных платформ."""
+    Формат выбирается параметром format (csv, txt, json, html, pdf)
+    или заголовком Accept, по умолчанию PDF для Linux и HTML для
+    остальных платформ. Текстовые форматы отдаются потоком.
+
+    GET всегда отдает файл сразу. POST ставит выгрузку в очередь
+    воркера для больших списков: ответ 202 содержит задание, файл
+    скачивается по его адресу."""
 
     permission_classes = (IsAuthenticated,)
 
-    def get_queryset(self):
-        """Возвращает queryset общего количества ингредиентов."""
-        user = self.request.user
-        shopping_lists = (
-            user.shopping_lists.select_related(
-                "receipt__ingredientinrecipe__ingredient"
-            )
-            .values(
-                "receipt__ingredientinrecipe__ingredient__pk",
-                "receipt__ingredientinrecipe__ingredient__name",
-                "receipt__ingredientinrecipe__ingredient__measurement_unit",
-            )
-            .annotate(
-                total_ingredients=Sum("receipt__ingredientinrecipe__amount")
-            )
-            .order_by("receipt__ingredientinrecipe__ingredient__name")
-        )
-        return shopping_lists
-
-    def format_summary(self, summary):
-        """Возвращает словарь данных об ингредиенте в списке покупок."""
-        return {
-            "name": summary["receipt__ingredientinrecipe__ingredient__name"],
-            "measurement_unit": summary[
-                "receipt__ingredientinrecipe__ingredient__measurement_unit"
-            ],
-            "total_ingredients": summary["total_ingredients"],
-        }
+    def perform_content_negotiation(self, request, force=False):
+        # format и Accept выбирают формат файла, а не рендерер DRF,
+        # ошибки при этом отдаются в JSON.
+        return super().perform_content_negotiation(request, force=True)
 
     def get(self, request, *args, **kwargs):
-        summ_list = self.get_queryset()
-        result_summ_list = [
-            self.format_summary(summary) for summary in summ_list
-        ]
-        return get_file(generate_file(generate_html(result_summ_list)))
+        file_format = choose_format(request)
+        if file_format in WRITERS:
+            return stream_file(request.user, file_format)
+        return get_file(
+            get_cached_file(get_summary_rows(request.user), file_format),
+            file_format,
+        )
+
+    def post(self, request, *args, **kwargs):
+        serializer = ShoppingListExportSerializer(
+            create_export(request.user), context={"request": request}
+        )
+        return Response(
+            serializer.data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": serializer.data["url"]},
+        )
+
+
+class ShoppingListExportDownload(generics.RetrieveAPIView):
+    """Возвращает состояние выгрузки списка покупок или готовый файл."""
+
+    permission_classes = (IsAuthenticated,)
+    serializer_class = ShoppingListExportSerializer
+
+    def get_queryset(self):
+        return self.request.user.shopping_list_exports.all()
+
+    def retrieve(self, request, *args, **kwargs):
+        export = self.get_object()
+        if export.status == ShoppingListExport.DONE:
+            return export_response(export)
+        return Response(
+            self.get_serializer(export).data,
+            status=(
+                status.HTTP_200_OK
+                if export.status == ShoppingListExport.FAILED
+                else status.HTTP_202_ACCEPTED
+            ),
+        )
@@ -41,6 +41,8 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    # Регистрирует lookup trigram_similar (оператор % из pg_trgm).
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "django_filters",
@@ -99,12 +101,66 @@ AVALIABLE_DBS = (
     {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Тестовая база в файле, а не в памяти: к ней подключаются
+        # несколько потоков в тестах параллельных запросов.
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     },
 )
 
 DATABASES = {"default": AVALIABLE_DBS[int(USED_DB)]}
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+USED_CACHE = os.getenv("CACHE_BACKEND", "locmem")
+
+AVALIABLE_CACHES = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("CACHE_LOCATION", BASE_DIR / "cache"),
+    },
+    "redis": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": os.getenv("CACHE_LOCATION", "redis://redis:6379/0"),
+    },
+}
+
+CACHES = {"default": AVALIABLE_CACHES[USED_CACHE]}
+
+RECIPE_CARD_CACHE_TIMEOUT = int(
+    os.getenv("RECIPE_CARD_CACHE_TIMEOUT", 60 * 60 * 24)
+)
+
+# Версии справочников сбрасываются из кэша при изменении, таймаут
+# ограничивает устаревание для локального кэша каждого воркера.
+CATALOGUE_VERSION_CACHE_TIMEOUT = int(
+    os.getenv("CATALOGUE_VERSION_CACHE_TIMEOUT", 60)
+)
+# Снимки справочников тэгов и ингредиентов в JSON, gzip и brotli.
+# В контейнере пишутся в том со статикой и отдаются nginx.
+CATALOGUE_SNAPSHOT_ROOT = os.getenv(
+    "CATALOGUE_SNAPSHOT_ROOT", BASE_DIR / "catalogue_snapshots"
+)
+
+# Нечеткий поиск по названиям: в PostgreSQL через pg_trgm, в остальных
+# базах через индекс триграмм в памяти (не больше FUZZY_SEARCH_LIMIT
+# результатов). Порог сходства совпадает с умолчанием pg_trgm.
+TRIGRAM_SIMILARITY_THRESHOLD = float(
+    os.getenv("TRIGRAM_SIMILARITY_THRESHOLD", 0.3)
+)
+FUZZY_SEARCH_LIMIT = 100
+# Начало слова и синоним, с которым оно дополнительно ищется.
+SEARCH_SYNONYMS = {
+    "помидор": "томат",
+    "картошк": "картофель",
+    "курочк": "курица",
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -167,6 +223,83 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 6,
 }
 
+# Лента подписок: рецепт рассылается по лентам подписчиков при публикации,
+# если их не больше FEED_FANOUT_LIMIT, иначе подмешивается при чтении.
+
+FEED_FANOUT_LIMIT = int(os.getenv("FEED_FANOUT_LIMIT", 1000))
+FEED_BATCH_SIZE = 500
+FEED_BACKFILL_SIZE = 50
+FEED_HEAVY_AUTHORS_CACHE_TIMEOUT = 60 * 10
+
+# Пул процессов для рендеринга PDF списка покупок в каждом воркере
+# gunicorn. 0 процессов - рендеринг в самом воркере.
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", 2))
+# Заданий на процесс, после которых пул перезапускается.
+PDF_RENDER_MAX_TASKS = int(os.getenv("PDF_RENDER_MAX_TASKS", 100))
+# Заданий в пуле одновременно, остальные ждут места.
+PDF_RENDER_QUEUE_SIZE = int(
+    os.getenv("PDF_RENDER_QUEUE_SIZE", PDF_RENDER_WORKERS * 2 or 1)
+)
+# Секунд ожидания места в пуле и рендеринга документа.
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", 10))
+
+# Кэш готовых файлов списка покупок на диске, общий для воркеров.
+# При превышении размера удаляются давно не скачанные файлы.
+SHOPPING_LIST_CACHE_ROOT = os.getenv(
+    "SHOPPING_LIST_CACHE_ROOT", BASE_DIR / "shopping_list_cache"
+)
+SHOPPING_LIST_CACHE_MAX_BYTES = int(
+    os.getenv("SHOPPING_LIST_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+)
+
+# Выгрузки по POST выполняет воркер (process_shopping_list_exports).
+# Задание в работе дольше SHOPPING_LIST_EXPORT_TIMEOUT секунд
+# возвращается в очередь, готовые задания хранятся
+# SHOPPING_LIST_EXPORT_TTL секунд.
+SHOPPING_LIST_EXPORT_TIMEOUT = 60 * 5
+SHOPPING_LIST_EXPORT_TTL = 60 * 60 * 24
+SHOPPING_LIST_EXPORT_POLL_INTERVAL = 1
+# Готовые файлы отдает nginx по X-Accel-Redirect.
+SHOPPING_LIST_EXPORT_X_ACCEL = (
+    os.getenv("SHOPPING_LIST_EXPORT_X_ACCEL", "false").lower() == "true"
+)
+
+# Наибольшее число рецептов в одном запросе к recipes/*/bulk/.
+BULK_RECIPES_MAX_IDS = int(os.getenv("BULK_RECIPES_MAX_IDS", 500))
+
+# Соль перестановки коротких ссылок рецептов. При ее смене все
+# выданные ссылки на рецепты перестают открываться.
+SHORT_LINK_SALT = os.getenv("SHORT_LINK_SALT", "foodgram")
+# Сохраненные короткие ссылки ищутся в LRU процесса (не больше
+# SHORT_LINK_LRU_SIZE записей на SHORT_LINK_LRU_TIMEOUT секунд), затем
+# в общем кэше. Неизвестные коды кэшируются на
+# SHORT_LINK_NEGATIVE_CACHE_TIMEOUT секунд.
+SHORT_LINK_LRU_SIZE = int(os.getenv("SHORT_LINK_LRU_SIZE", 10000))
+SHORT_LINK_LRU_TIMEOUT = 60
+SHORT_LINK_CACHE_TIMEOUT = 60 * 60 * 24
+SHORT_LINK_NEGATIVE_CACHE_TIMEOUT = 60
+# Cache-Control: max-age постоянных редиректов на рецепты и временных
+# редиректов по сохраненным ссылкам.
+SHORT_LINK_PERMANENT_MAX_AGE = 60 * 60 * 24 * 30
+SHORT_LINK_TEMPORARY_MAX_AGE = 60 * 60
+# Переходы по коротким ссылкам копятся в памяти воркера и пишутся
+# в базу каждые SHORT_LINK_HITS_FLUSH_SIZE переходов или
+# SHORT_LINK_HITS_FLUSH_INTERVAL секунд. 0 отключает учет.
+SHORT_LINK_HITS_FLUSH_SIZE = int(os.getenv("SHORT_LINK_HITS_FLUSH_SIZE", 500))
+SHORT_LINK_HITS_FLUSH_INTERVAL = 10
+# Карта коротких ссылок рецептов для nginx, ее пишет команда
+# export_short_links.
+SHORT_LINK_MAP_PATH = os.getenv(
+    "SHORT_LINK_MAP_PATH", BASE_DIR / "short_links" / "short_links.map"
+)
+# Ограничения изображений в base64 (рецепты и аватары): размер
+# декодированного файла в байтах и число пикселей. Разрешение
+# проверяется по заголовку до декодирования всего файла.
+IMAGE_UPLOAD_MAX_BYTES = int(
+    os.getenv("IMAGE_UPLOAD_MAX_BYTES", 7 * 1024 * 1024)
+)
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv("IMAGE_UPLOAD_MAX_PIXELS", 50_000_000))
+
 DJOSER = {
     "LOGIN_FIELD": "email",
     "SERIALIZERS": {
@@ -1,6 +1,7 @@
 from django.contrib import admin
-from django.db.models import Count
+from django.db import transaction
 
+from api.cart_totals import get_recipe_amounts, recipe_amounts_changed
 from receipts.models import Receipt, IngredientInRecipe
 
 
@@ -20,9 +21,10 @@ class ReceiptAdmin(admin.ModelAdmin):
         "short_text",
         "cooking_time",
         "image",
-        "total_favorites",
+        "favorites_count",
+        "in_carts_count",
     )
-    readonly_fields = ("total_favorites",)  # Make total_favorites read-only
+    readonly_fields = ("favorites_count", "in_carts_count")
     fields = (
         "name",
         "author",
@@ -30,17 +32,19 @@ class ReceiptAdmin(admin.ModelAdmin):
         "cooking_time",
         "image",
         "tags",
-        "total_favorites",
+        "favorites_count",
+        "in_carts_count",
     )
     search_fields = ("name", "authot__username")
     filter_horizontal = ("tags",)
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.annotate(favorites_count=Count("favorites"))
-
-    def total_favorites(self, instance):
-        return instance.favorites_count
+    @transaction.atomic
+    def save_related(self, request, form, formsets, change):
+        """Переносит изменения ингредиентов во все списки покупок."""
+        old_amounts = get_recipe_amounts(form.instance.pk) if change else {}
+        super().save_related(request, form, formsets, change)
+        if change:
+            recipe_amounts_changed(form.instance.pk, old_amounts)
 
     def short_text(self, instance):
         return (
@@ -50,8 +54,6 @@ class ReceiptAdmin(admin.ModelAdmin):
         )
 
     short_text.short_description = "Описание"
-    total_favorites.short_description = "Добавлено в избранное раз"
-    total_favorites.admin_order_field = "favorites_count"
 
 
 admin.site.register(Receipt, ReceiptAdmin)
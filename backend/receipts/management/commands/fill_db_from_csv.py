@@ -2,12 +2,17 @@ from django.core.management.base import BaseCommand
 from django.db.utils import IntegrityError
 from pathlib import Path
 import pandas
+from api.snapshots import write_snapshot
+from api.versions import INGREDIENTS, bump_version
 from receipts.models import Ingredient
 
 
 FILES_WITH_DATA = {
     "ingredients": Ingredient,
 }
+CATALOGUES = {
+    Ingredient: INGREDIENTS,
+}
 
 
 class Command(BaseCommand):
@@ -45,6 +50,8 @@ class Command(BaseCommand):
 
             try:
                 model.objects.bulk_create(items)
+                bump_version(CATALOGUES[model])
+                write_snapshot(CATALOGUES[model])
                 print(f"Successfully imported data from {csv_file_path}")
             except IntegrityError as error:
                 print(f"Error with file {file_name} -- {error}")
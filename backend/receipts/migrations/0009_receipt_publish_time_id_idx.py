@@ -0,0 +1,69 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:20
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("receipts", "0008_auto_20240725_1403"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="follow",
+            options={
+                "ordering": ("user",),
+                "verbose_name": "подписка",
+                "verbose_name_plural": "Подписки",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="receipt",
+            options={
+                "ordering": ("-publish_time", "-id"),
+                "verbose_name": "рецепт",
+                "verbose_name_plural": "Рецепты",
+            },
+        ),
+        migrations.AlterField(
+            model_name="ingredientinrecipe",
+            name="amount",
+            field=models.PositiveSmallIntegerField(
+                help_text="Значение должно быть ≥ 1",
+                validators=[
+                    django.core.validators.MinValueValidator(
+                        1, "Значение должно быть ≥ 1"
+                    ),
+                    django.core.validators.MaxValueValidator(
+                        32000, "Значение должно быть ≤ 32000"
+                    ),
+                ],
+                verbose_name="Количество ингредиента в рецепте",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="receipt",
+            name="cooking_time",
+            field=models.PositiveSmallIntegerField(
+                help_text="Выражается в минутах",
+                validators=[
+                    django.core.validators.MinValueValidator(
+                        1, "Значение должно быть ≥ 1"
+                    ),
+                    django.core.validators.MaxValueValidator(
+                        32000, "Значение должно быть ≤ 32000"
+                    ),
+                ],
+                verbose_name="Время приготовления",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="receipt",
+            index=models.Index(
+                fields=["-publish_time", "-id"],
+                name="receipt_publish_time_id_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("receipts", "0009_receipt_publish_time_id_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogueVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        help_text="Обязательное поле",
+                        max_length=32,
+                        unique=True,
+                        verbose_name="Справочник",
+                    ),
+                ),
+                (
+                    "version",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Заполняется автоматически",
+                        verbose_name="Версия",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True,
+                        help_text="Заполняется автоматически",
+                        verbose_name="Время изменения",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "версия справочника",
+                "verbose_name_plural": "Версии справочников",
+                "ordering": ("name",),
+            },
+        ),
+        migrations.AddField(
+            model_name="receipt",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                help_text="Заполняется автоматически",
+                verbose_name="Время изменения",
+            ),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("receipts", "0010_catalogue_version_receipt_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "publish_time",
+                    models.DateTimeField(
+                        help_text="Копия времени публикации рецепта",
+                        verbose_name="Время публикации рецепта",
+                    ),
+                ),
+                (
+                    "receipt",
+                    models.ForeignKey(
+                        help_text="Обязательное поле",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_entries",
+                        to="receipts.receipt",
+                        verbose_name="Рецепт",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        help_text="Обязательное поле",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_entries",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Владелец ленты",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "запись ленты",
+                "verbose_name_plural": "Записи ленты",
+                "ordering": ("-publish_time", "-receipt"),
+            },
+        ),
+        migrations.AddIndex(
+            model_name="feedentry",
+            index=models.Index(
+                fields=["user", "-publish_time", "-receipt"],
+                name="feed_user_publish_time_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="feedentry",
+            constraint=models.UniqueConstraint(
+                fields=("user", "receipt"), name="user_receipt_in_feed_unique"
+            ),
+        ),
+    ]
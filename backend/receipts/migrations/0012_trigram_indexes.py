@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+TRIGRAM_INDEXES = (
+    ("Ingredient", "ingredient_name_trgm_idx"),
+    ("Receipt", "receipt_name_trgm_idx"),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Создает pg_trgm и GIN индексы по названиям только в PostgreSQL."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for model_name, index_name in TRIGRAM_INDEXES:
+        table = apps.get_model("receipts", model_name)._meta.db_table
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {index_name} "
+            f"ON {table} USING gin (name gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for _, index_name in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("receipts", "0011_feedentry"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("receipts", "0012_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShoppingListExport",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Идентификатор",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "В очереди"),
+                            ("running", "Выполняется"),
+                            ("done", "Готово"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="pending",
+                        help_text="Заполняется автоматически",
+                        max_length=16,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "file",
+                    models.FileField(
+                        blank=True,
+                        help_text="Заполняется воркером",
+                        upload_to="exports/",
+                        verbose_name="Файл",
+                    ),
+                ),
+                (
+                    "error",
+                    models.TextField(
+                        blank=True,
+                        help_text="Заполняется воркером",
+                        verbose_name="Ошибка",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text="Заполняется автоматически",
+                        verbose_name="Время создания",
+                    ),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Заполняется воркером",
+                        null=True,
+                        verbose_name="Время начала",
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="Заполняется воркером",
+                        null=True,
+                        verbose_name="Время завершения",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        help_text="Обязательное поле",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shopping_list_exports",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Владелец списка покупок",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "выгрузка списка покупок",
+                "verbose_name_plural": "Выгрузки списков покупок",
+                "ordering": ("-created_at",),
+            },
+        ),
+        migrations.AddIndex(
+            model_name="shoppinglistexport",
+            index=models.Index(
+                fields=["status", "created_at"],
+                name="export_status_created_idx",
+            ),
+        ),
+    ]
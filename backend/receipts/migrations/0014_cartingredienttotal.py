@@ -0,0 +1,99 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_cart_totals(apps, schema_editor):
+    """Заполняет суммы ингредиентов для существующих списков покупок."""
+    ShoppingList = apps.get_model("receipts", "ShoppingList")
+    CartIngredientTotal = apps.get_model("receipts", "CartIngredientTotal")
+    rows = (
+        ShoppingList.objects.values(
+            "user_id", "receipt__ingredientinrecipe__ingredient_id"
+        )
+        .annotate(total=Sum("receipt__ingredientinrecipe__amount"))
+        .filter(total__gt=0)
+        .order_by()
+    )
+    CartIngredientTotal.objects.bulk_create(
+        (
+            CartIngredientTotal(
+                user_id=row["user_id"],
+                ingredient_id=row[
+                    "receipt__ingredientinrecipe__ingredient_id"
+                ],
+                total=row["total"],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("receipts", "0013_shoppinglistexport"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CartIngredientTotal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "total",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Заполняется автоматически",
+                        verbose_name="Количество",
+                    ),
+                ),
+                (
+                    "ingredient",
+                    models.ForeignKey(
+                        help_text="Обязательное поле",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cart_totals",
+                        to="receipts.ingredient",
+                        verbose_name="Ингредиент",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        help_text="Обязательное поле",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cart_totals",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Владелец списка покупок",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "ингредиент в списке покупок",
+                "verbose_name_plural": "Ингредиенты в списках покупок",
+                "ordering": ("id",),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="cartingredienttotal",
+            constraint=models.UniqueConstraint(
+                fields=("user", "ingredient"),
+                name="user_ingredient_in_cart_unique",
+            ),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
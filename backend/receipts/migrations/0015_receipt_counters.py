@@ -0,0 +1,71 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:48
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    """Считает счетчики избранного и списков покупок у рецептов."""
+    Receipt = apps.get_model("receipts", "Receipt")
+    counters = {}
+    for field, model_name in (
+        ("favorites_count", "Favorite"),
+        ("in_carts_count", "ShoppingList"),
+    ):
+        links = apps.get_model("receipts", model_name).objects.filter(
+            receipt=OuterRef("pk")
+        )
+        counters[field] = Coalesce(
+            Subquery(
+                links.order_by()
+                .values("receipt")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+    Receipt.objects.update(**counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("receipts", "0014_cartingredienttotal"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="receipt",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Заполняется автоматически",
+                verbose_name="Добавлено в избранное раз",
+            ),
+        ),
+        migrations.AddField(
+            model_name="receipt",
+            name="in_carts_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Заполняется автоматически",
+                verbose_name="Добавлено в списки покупок раз",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="receipt",
+            index=models.Index(
+                fields=["-favorites_count", "-publish_time", "-id"],
+                name="receipt_favorites_count_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="receipt",
+            index=models.Index(
+                fields=["-in_carts_count", "-publish_time", "-id"],
+                name="receipt_in_carts_count_idx",
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
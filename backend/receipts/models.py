@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -11,6 +13,8 @@ MAX_COOKING_TIME = 32000
 MAX_INGREDIENT_AMOUNT = 32000
 MIN_COOKING_TIME = 1
 MIN_INGREDIENT_AMOUNT = 1
+# Счетчики рецепта, которые меняются только через F() (api.counters).
+RECEIPT_COUNTER_FIELDS = ("favorites_count", "in_carts_count")
 
 
 class Tag(models.Model):
@@ -109,15 +113,56 @@ class Receipt(models.Model):
         verbose_name="Время публикации",
         help_text="Заполняется автоматически",
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Время изменения",
+        help_text="Заполняется автоматически",
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Добавлено в избранное раз",
+        help_text="Заполняется автоматически",
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Добавлено в списки покупок раз",
+        help_text="Заполняется автоматически",
+    )
 
     class Meta:
         verbose_name = "рецепт"
         verbose_name_plural = "Рецепты"
-        ordering = ("-publish_time",)
+        ordering = ("-publish_time", "-id")
+        indexes = (
+            models.Index(
+                fields=("-publish_time", "-id"),
+                name="receipt_publish_time_id_idx",
+            ),
+            models.Index(
+                fields=("-favorites_count", "-publish_time", "-id"),
+                name="receipt_favorites_count_idx",
+            ),
+            models.Index(
+                fields=("-in_carts_count", "-publish_time", "-id"),
+                name="receipt_in_carts_count_idx",
+            ),
+        )
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Сохранение существующего рецепта не перезаписывает счетчики
+        значениями, прочитанными до параллельного изменения."""
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in RECEIPT_COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class IngredientInRecipe(models.Model):
     """Модель ингредиента в конкретном рецепте."""
@@ -203,6 +248,52 @@ class ShoppingList(models.Model):
         return f"{self.receipt} в списке покупок у {self.user}"
 
 
+class CartIngredientTotal(models.Model):
+    """Модель суммарного количества ингредиента в списке покупок.
+
+    Поддерживается при добавлении и удалении рецептов из списка
+    покупок и при изменении ингредиентов рецепта, чтобы список
+    покупок читался без агрегации.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name="Владелец списка покупок",
+        on_delete=models.CASCADE,
+        help_text="Обязательное поле",
+        related_name="cart_totals",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name="Ингредиент",
+        on_delete=models.CASCADE,
+        help_text="Обязательное поле",
+        related_name="cart_totals",
+    )
+    total = models.IntegerField(
+        default=0,
+        verbose_name="Количество",
+        help_text="Заполняется автоматически",
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=("user", "ingredient"),
+                name="user_ingredient_in_cart_unique",
+            ),
+        )
+        verbose_name = "ингредиент в списке покупок"
+        verbose_name_plural = "Ингредиенты в списках покупок"
+        ordering = ("id",)
+
+    def __str__(self):
+        return (
+            f"{self.ingredient} в списке покупок у {self.user} "
+            f"в количестве {self.total}"
+        )
+
+
 class Favorite(models.Model):
     """Модель избранных рецептов пользователя."""
 
@@ -269,3 +360,167 @@ class Follow(models.Model):
 
     def __str__(self):
         return f"{self.user} подписан на {self.following}"
+
+
+class CatalogueVersion(models.Model):
+    """Модель версии справочника (тэгов, ингредиентов).
+
+    Версия увеличивается при каждом изменении справочника и используется
+    для валидации закэшированных клиентом ответов.
+    """
+
+    name = models.CharField(
+        max_length=32,
+        unique=True,
+        verbose_name="Справочник",
+        help_text="Обязательное поле",
+    )
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Версия",
+        help_text="Заполняется автоматически",
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Время изменения",
+        help_text="Заполняется автоматически",
+    )
+
+    class Meta:
+        verbose_name = "версия справочника"
+        verbose_name_plural = "Версии справочников"
+        ordering = ("name",)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class FeedEntry(models.Model):
+    """Модель записи в ленте подписок пользователя.
+
+    Записи создаются при публикации рецепта для подписчиков автора.
+    Рецепты авторов с большим числом подписчиков в ленту не пишутся
+    и подмешиваются при чтении.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name="Владелец ленты",
+        on_delete=models.CASCADE,
+        help_text="Обязательное поле",
+        related_name="feed_entries",
+    )
+    receipt = models.ForeignKey(
+        Receipt,
+        verbose_name="Рецепт",
+        on_delete=models.CASCADE,
+        help_text="Обязательное поле",
+        related_name="feed_entries",
+    )
+    publish_time = models.DateTimeField(
+        verbose_name="Время публикации рецепта",
+        help_text="Копия времени публикации рецепта",
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=("user", "receipt"),
+                name="user_receipt_in_feed_unique",
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=("user", "-publish_time", "-receipt"),
+                name="feed_user_publish_time_idx",
+            ),
+        )
+        verbose_name = "запись ленты"
+        verbose_name_plural = "Записи ленты"
+        ordering = ("-publish_time", "-receipt")
+
+    def __str__(self):
+        return f"{self.receipt} в ленте у {self.user}"
+
+
+class ShoppingListExport(models.Model):
+    """Модель задания на выгрузку списка покупок в файл.
+
+    Задания создаются для больших списков покупок и выполняются
+    воркером (команда process_shopping_list_exports), который забирает
+    их из базы. Готовый файл хранится в MEDIA_ROOT.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = (
+        (PENDING, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (DONE, "Готово"),
+        (FAILED, "Ошибка"),
+    )
+
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+        verbose_name="Идентификатор",
+    )
+    user = models.ForeignKey(
+        User,
+        verbose_name="Владелец списка покупок",
+        on_delete=models.CASCADE,
+        help_text="Обязательное поле",
+        related_name="shopping_list_exports",
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name="Статус",
+        help_text="Заполняется автоматически",
+    )
+    file = models.FileField(
+        upload_to="exports/",
+        blank=True,
+        verbose_name="Файл",
+        help_text="Заполняется воркером",
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name="Ошибка",
+        help_text="Заполняется воркером",
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Время создания",
+        help_text="Заполняется автоматически",
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Время начала",
+        help_text="Заполняется воркером",
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Время завершения",
+        help_text="Заполняется воркером",
+    )
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=("status", "created_at"),
+                name="export_status_created_idx",
+            ),
+        )
+        verbose_name = "выгрузка списка покупок"
+        verbose_name_plural = "Выгрузки списков покупок"
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"Выгрузка списка покупок {self.user} ({self.status})"
@@ -1,14 +1,80 @@
+import base64
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
 from http import HTTPStatus
+from pathlib import Path
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
 
+import brotli
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from rest_framework.test import APIClient
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ModelSerializer
+from rest_framework.test import APIClient, APIRequestFactory
 
-from receipts.models import Ingredient, Tag
+from api import shopping_list
+from api.bulk import get_links
+from api.exports import claim_export
+from api.fast_serializers import recipe_basic_to_dict, recipe_card_to_dict
+from api.file_cache import FileCache
+from api.fuzzy_search import TrigramIndex, trigrams
+from api.pdf_pool import PdfRenderPool, PdfRenderUnavailable
+from api.recipe_cards import card_key
+from api.serializers import (
+    IngredientSerializer,
+    RecipeCardSerializer,
+    RecipeSerializerGetRequestBasic,
+)
+from api.versions import INGREDIENTS, RECIPES, TAGS, get_version
+from receipts.models import (
+    CartIngredientTotal,
+    Favorite,
+    FeedEntry,
+    Follow,
+    Ingredient,
+    IngredientInRecipe,
+    Receipt,
+    ShoppingList,
+    ShoppingListExport,
+    Tag,
+)
+from shortlink import short_link
+from shortlink.hits import hit_buffer
+from shortlink.models import ShortLink
 
 
 class BaseTestData(TestCase):
     def setUp(self):
+        cache.clear()
+        self.snapshot_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.snapshot_root)
+        snapshot_settings = override_settings(
+            CATALOGUE_SNAPSHOT_ROOT=self.snapshot_root,
+            SHOPPING_LIST_CACHE_ROOT=Path(self.snapshot_root, "documents"),
+            MEDIA_ROOT=Path(self.snapshot_root, "media"),
+            SHORT_LINK_MAP_PATH=Path(self.snapshot_root, "short_links.map"),
+        )
+        snapshot_settings.enable()
+        self.addCleanup(snapshot_settings.disable)
         user = get_user_model()
         self.user = user.objects.create_user(username="auth_user")
         self.client = APIClient()
@@ -80,3 +146,1622 @@ class IngredientAPITests(BaseTestData):
             HTTPStatus.CREATED,
             msg="Код статуса ответа должен быть 201.",
         )
+
+
+class ImageUploadTests(BaseTestData):
+    avatar_endpoint = "/api/users/me/avatar/"
+
+    def encode(self, image, image_format="PNG"):
+        content = io.BytesIO()
+        image.save(content, image_format)
+        return "data:image/png;base64," + base64.b64encode(
+            content.getvalue()
+        ).decode()
+
+    def put_avatar(self, avatar):
+        return self.client.put(
+            self.avatar_endpoint, data={"avatar": avatar}, format="json"
+        )
+
+    def test_extension_from_content(self):
+        response = self.put_avatar(
+            self.encode(Image.new("RGB", (2, 2)), "JPEG")
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar.name.endswith(".jpg"))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=10)
+    def test_size_checked_before_decoding(self):
+        with mock.patch(
+            "api.images.base64.b64decode", wraps=base64.b64decode
+        ) as decode:
+            response = self.put_avatar(self.encode(Image.new("RGB", (2, 2))))
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        decode.assert_not_called()
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=1000 * 1000)
+    def test_pixels_checked_by_header(self):
+        """Разрешение проверяется до декодирования всей строки."""
+        avatar = self.encode(Image.effect_noise((1001, 1000), 64))
+        with mock.patch("api.images.CHUNK_SIZE", 1024), mock.patch(
+            "api.images.base64.b64decode", wraps=base64.b64decode
+        ) as decode:
+            response = self.put_avatar(avatar)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(decode.call_count, 1)
+
+    def test_rejects_other_content(self):
+        for avatar in (
+            "data:image/png;base64," + base64.b64encode(b"text").decode(),
+            "data:image/png;base64,not base64",
+            "data:image/png,plain",
+        ):
+            with self.subTest(avatar=avatar):
+                response = self.put_avatar(avatar)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST
+                )
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.avatar)
+
+
+class RecipeListQueriesTests(BaseTestData):
+    recipe_endpoint = "/api/recipes/"
+    recipes_count = 8
+
+    def setUp(self):
+        super().setUp()
+        for number in range(self.recipes_count):
+            recipe = Receipt.objects.create(
+                author=self.user,
+                name=f"Рецепт {number}",
+                text="Тестовое описание",
+                cooking_time=1,
+            )
+            recipe.tags.set((self.tag,))
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=self.firstIndredient, amount=1
+            )
+            if number % 2:
+                Favorite.objects.create(user=self.user, receipt=recipe)
+                ShoppingList.objects.create(user=self.user, receipt=recipe)
+
+    def capture_page_queries(self, limit):
+        """Возвращает SQL запросы, выполненные при загрузке страницы."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                self.recipe_endpoint, {"limit": limit}
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [query["sql"] for query in context.captured_queries]
+
+    def count_flag_queries(self, limit):
+        """Считает запросы к избранному и спискам покупок на страницу."""
+        return len(
+            [
+                sql
+                for sql in self.capture_page_queries(limit)
+                if "receipts_favorite" in sql
+                or "receipts_shoppinglist" in sql
+            ]
+        )
+
+    def test_flags_queries_do_not_depend_on_limit(self):
+        """Флаги is_favorited и is_in_shopping_cart не дают N+1."""
+        self.assertEqual(
+            self.count_flag_queries(limit=2),
+            self.count_flag_queries(limit=self.recipes_count),
+        )
+
+    def test_page_queries_do_not_depend_on_limit(self):
+        """Автор, тэги и ингредиенты подгружаются без N+1."""
+        self.assertEqual(
+            len(self.capture_page_queries(limit=2)),
+            len(self.capture_page_queries(limit=self.recipes_count)),
+        )
+
+    def test_flags_are_annotated(self):
+        """Аннотированные флаги совпадают с данными пользователя."""
+        response = self.client.get(
+            self.recipe_endpoint, {"limit": self.recipes_count}
+        )
+        for recipe in response.json()["results"]:
+            expected = self.user.favorites.filter(
+                receipt_id=recipe["id"]
+            ).exists()
+            self.assertEqual(recipe["is_favorited"], expected)
+            self.assertEqual(recipe["is_in_shopping_cart"], expected)
+
+    def test_cursor_pagination_walks_all_recipes(self):
+        """Курсор проходит все рецепты без повторов и пропусков."""
+        Receipt.objects.update(publish_time=timezone.now())
+        seen = []
+        url = self.recipe_endpoint
+        params = {"cursor": "", "limit": 3}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            data = response.json()
+            self.assertNotIn("count", data)
+            seen.extend(recipe["id"] for recipe in data["results"])
+            url, params = data["next"], None
+        self.assertEqual(
+            seen,
+            list(
+                Receipt.objects.order_by("-publish_time", "-id").values_list(
+                    "id", flat=True
+                )
+            ),
+        )
+
+    def walk_cursor(self, **params):
+        seen = []
+        url = self.recipe_endpoint
+        params = {"cursor": "", "limit": 3, **params}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            seen.extend(recipe["id"] for recipe in response.json()["results"])
+            url, params = response.json()["next"], None
+        return seen
+
+    def test_cursor_pagination_keeps_ordering(self):
+        """Курсор идет в порядке ?ordering=, а не времени публикации."""
+        recipes = list(Receipt.objects.order_by("id"))
+        for number, recipe in enumerate(recipes):
+            Receipt.objects.filter(pk=recipe.pk).update(
+                favorites_count=number % 3
+            )
+        for prefix in ("-", ""):
+            ordering = f"{prefix}favorites_count"
+            with self.subTest(ordering=ordering):
+                expected = list(
+                    Receipt.objects.order_by(
+                        ordering, f"{prefix}publish_time", f"{prefix}id"
+                    ).values_list("id", flat=True)
+                )
+                self.assertEqual(
+                    self.walk_cursor(ordering=ordering), expected
+                )
+
+    def test_cursor_is_bound_to_ordering(self):
+        response = self.client.get(
+            self.recipe_endpoint, {"cursor": "", "limit": 3}
+        )
+        cursor = parse_qs(urlparse(response.json()["next"]).query)["cursor"]
+        response = self.client.get(
+            self.recipe_endpoint,
+            {"cursor": cursor, "ordering": "-favorites_count"},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_cursor_pagination_rejects_invalid_cursor(self):
+        """Неверный курсор возвращает 404."""
+        response = self.client.get(self.recipe_endpoint, {"cursor": "@@"})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_recipe_cards_are_cached(self):
+        """Повторная загрузка страницы берет карточки из кэша."""
+        first_page = self.capture_page_queries(limit=self.recipes_count)
+        second_page = self.capture_page_queries(limit=self.recipes_count)
+        self.assertLess(len(second_page), len(first_page))
+
+    def test_recipe_card_invalidated_on_tag_change(self):
+        """Изменение тэга сбрасывает кэш карточек его рецептов."""
+        self.client.get(self.recipe_endpoint)
+        self.tag.name = "ужин"
+        self.tag.save()
+        response = self.client.get(self.recipe_endpoint)
+        for recipe in response.json()["results"]:
+            self.assertEqual(recipe["tags"][0]["name"], "ужин")
+
+    def get_first_card(self):
+        response = self.client.get(self.recipe_endpoint)
+        return response.json()["results"][0]
+
+    def test_recipe_card_invalidated_on_ingredient_change(self):
+        self.get_first_card()
+        self.firstIndredient.name = "батон"
+        self.firstIndredient.save()
+        self.assertEqual(
+            self.get_first_card()["ingredients"][0]["name"], "батон"
+        )
+
+    def test_recipe_card_invalidated_on_amount_change(self):
+        card = self.get_first_card()
+        ingredient_in_recipe = IngredientInRecipe.objects.get(
+            recipe_id=card["id"]
+        )
+        ingredient_in_recipe.amount = 5
+        ingredient_in_recipe.save()
+        self.assertEqual(self.get_first_card()["ingredients"][0]["amount"], 5)
+        ingredient_in_recipe.delete()
+        self.assertEqual(self.get_first_card()["ingredients"], [])
+
+    def test_recipe_card_invalidated_on_author_change(self):
+        self.get_first_card()
+        self.user.first_name = "Иван"
+        self.user.save()
+        self.assertEqual(self.get_first_card()["author"]["first_name"], "Иван")
+
+    def test_recipe_card_invalidated_after_commit(self):
+        """Карточка, прочитанная до коммита, сбрасывается после него."""
+        recipe = Receipt.objects.get(pk=self.get_first_card()["id"])
+        stale_card = cache.get(card_key(recipe.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                recipe.name = "Новое название"
+                recipe.save()
+                cache.set(card_key(recipe.pk), stale_card)
+        self.assertEqual(self.get_first_card()["name"], "Новое название")
+
+
+class RecipeCardSharedCacheTests(BaseTestData):
+    """Карточки в общем кэше воркеров.
+
+    Вместо Redis используется файловый кэш во временном каталоге:
+    он тоже общий для процессов и хранит сериализованные значения.
+    """
+
+    recipe_endpoint = "/api/recipes/"
+
+    def setUp(self):
+        self.cache_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_root)
+        cache_settings = override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": (
+                        "django.core.cache.backends.filebased.FileBasedCache"
+                    ),
+                    "LOCATION": self.cache_root,
+                }
+            }
+        )
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+        super().setUp()
+        self.recipe = Receipt.objects.create(
+            author=self.user, name="Рецепт", text="Описание", cooking_time=1
+        )
+        # Кэш другого воркера с тем же хранилищем.
+        self.worker_cache = FileBasedCache(self.cache_root, {})
+
+    def get_card(self):
+        response = self.client.get(self.recipe_endpoint)
+        return response.json()["results"][0]
+
+    def test_cards_are_shared(self):
+        self.get_card()
+        self.assertEqual(
+            self.worker_cache.get(card_key(self.recipe.pk))["name"], "Рецепт"
+        )
+
+    def test_stale_card_from_other_worker_is_dropped(self):
+        """Карточка, записанная другим воркером до коммита, удаляется."""
+        self.get_card()
+        stale_card = self.worker_cache.get(card_key(self.recipe.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.recipe.name = "Новое название"
+                self.recipe.save()
+                self.worker_cache.set(card_key(self.recipe.pk), stale_card)
+        self.assertIsNone(self.worker_cache.get(card_key(self.recipe.pk)))
+        self.assertEqual(self.get_card()["name"], "Новое название")
+
+
+class ConditionalGetTests(BaseTestData):
+    def setUp(self):
+        super().setUp()
+        self.recipe = Receipt.objects.create(
+            author=self.user,
+            name="Бутерброд",
+            text="Тестовое описание",
+            cooking_time=1,
+        )
+        self.recipe.tags.set((self.tag,))
+
+    def assertNotModified(self, url):
+        """Повторный запрос с ETag возвращает 304, а ответ не меняется."""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        etag = response["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        return etag
+
+    def test_tags_not_modified_until_change(self):
+        """ETag списка тэгов меняется после изменения тэга."""
+        etag = self.assertNotModified("/api/tags/")
+        Tag.objects.create(slug="dinner", name="ужин")
+        response = self.client.get("/api/tags/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_ingredients_not_modified(self):
+        """Список ингредиентов поддерживает If-None-Match."""
+        self.assertNotModified("/api/ingredients/")
+
+    def test_recipe_not_modified_until_favorited(self):
+        """ETag рецепта учитывает флаги текущего пользователя."""
+        url = f"/api/recipes/{self.recipe.pk}/"
+        etag = self.assertNotModified(url)
+        Favorite.objects.create(user=self.user, receipt=self.recipe)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.json()["is_favorited"])
+
+    def test_recipe_not_modified_skips_main_query(self):
+        """Ответ 304 обходится одним запросом к базе."""
+        url = f"/api/recipes/{self.recipe.pk}/"
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+
+class FastSerializersTests(BaseTestData):
+    def setUp(self):
+        super().setUp()
+        self.user.avatar = "users/avatar.png"
+        self.user.save()
+        self.recipe = Receipt.objects.create(
+            author=self.user,
+            name="Бутерброд",
+            text="Тестовое описание",
+            cooking_time=5,
+            image="recipes/images/sandwich.png",
+        )
+        self.recipe.tags.set((self.tag,))
+        IngredientInRecipe.objects.create(
+            recipe=self.recipe, ingredient=self.firstIndredient, amount=2
+        )
+        IngredientInRecipe.objects.create(
+            recipe=self.recipe, ingredient=self.secondIndredient, amount=3
+        )
+
+    def test_recipe_card_matches_serializer(self):
+        """Быстрая карточка совпадает с RecipeCardSerializer побайтно."""
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(recipe_card_to_dict(self.recipe)),
+            renderer.render(RecipeCardSerializer(self.recipe).data),
+        )
+
+    def test_recipe_basic_matches_serializer(self):
+        """Краткий рецепт совпадает с форматом ModelSerializer."""
+        request = APIRequestFactory().get("/")
+        serializer = RecipeSerializerGetRequestBasic(
+            context={"request": request}
+        )
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(recipe_basic_to_dict(self.recipe, request)),
+            renderer.render(
+                ModelSerializer.to_representation(serializer, self.recipe)
+            ),
+        )
+
+
+class SubscriptionsTests(BaseTestData):
+    subscriptions_endpoint = "/api/users/subscriptions/"
+
+    def create_authors(self, count, recipes_per_author=3):
+        user = get_user_model()
+        for number in range(count):
+            author = user.objects.create_user(
+                username=f"author_{self.authors_created}",
+                email=f"author_{self.authors_created}@example.com",
+            )
+            self.authors_created += 1
+            Follow.objects.create(user=self.user, following=author)
+            for recipe_number in range(recipes_per_author):
+                Receipt.objects.create(
+                    author=author,
+                    name=f"Рецепт {recipe_number}",
+                    text="Тестовое описание",
+                    cooking_time=1,
+                )
+
+    def setUp(self):
+        super().setUp()
+        self.authors_created = 0
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                self.subscriptions_endpoint, {"limit": 100}
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(context.captured_queries)
+
+    def test_queries_do_not_depend_on_authors_count(self):
+        """Подписки загружаются без запросов на каждого автора."""
+        self.create_authors(2)
+        few_authors_queries = self.count_queries()
+        self.create_authors(5)
+        self.assertEqual(self.count_queries(), few_authors_queries)
+
+    def test_recipes_limit_and_count(self):
+        """Превью ограничено recipes_limit, счетчик считает все рецепты."""
+        self.create_authors(2, recipes_per_author=4)
+        response = self.client.get(
+            self.subscriptions_endpoint, {"recipes_limit": 2}
+        )
+        for author in response.json()["results"]:
+            self.assertTrue(author["is_subscribed"])
+            self.assertEqual(author["recipes_count"], 4)
+            self.assertEqual(len(author["recipes"]), 2)
+            recipe_ids = [recipe["id"] for recipe in author["recipes"]]
+            self.assertEqual(
+                recipe_ids,
+                list(
+                    Receipt.objects.filter(
+                        author_id=author["id"]
+                    ).values_list("id", flat=True)[:2]
+                ),
+            )
+
+    def test_invalid_recipes_limit(self):
+        """recipes_limit должен быть положительным целым числом."""
+        self.create_authors(1)
+        author = get_user_model().objects.create_user(
+            username="new_author", email="new_author@example.com"
+        )
+        for value in ("abc", "0", "-1", "1.5"):
+            with self.subTest(recipes_limit=value):
+                response = self.client.get(
+                    self.subscriptions_endpoint, {"recipes_limit": value}
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST
+                )
+                self.assertIn("recipes_limit", response.json())
+                response = self.client.post(
+                    f"/api/users/{author.pk}/subscribe/"
+                    f"?recipes_limit={value}"
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST
+                )
+        self.assertFalse(
+            Follow.objects.filter(user=self.user, following=author).exists()
+        )
+
+
+class FeedTests(BaseTestData):
+    feed_endpoint = "/api/recipes/feed/"
+
+    def setUp(self):
+        super().setUp()
+        self.author = get_user_model().objects.create_user(
+            username="author", email="author@example.com"
+        )
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(user=self.author)
+        Follow.objects.create(user=self.user, following=self.author)
+
+    def publish_recipe(self):
+        response = self.author_client.post(
+            "/api/recipes/",
+            data={
+                "ingredients": [{"id": self.firstIndredient.id, "amount": 1}],
+                "tags": [self.tag.id],
+                "image": (
+                    "data:image/png;base64,"
+                    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAACVB"
+                    "MVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAA"
+                    "AACklEQVQImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg=="
+                ),
+                "name": "Бутерброд",
+                "text": "Тестовое описание",
+                "cooking_time": 1,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        return response.json()["id"]
+
+    def get_feed_ids(self):
+        response = self.client.get(self.feed_endpoint)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [recipe["id"] for recipe in response.json()["results"]]
+
+    def test_published_recipe_is_fanned_out(self):
+        """Опубликованный рецепт попадает в ленту подписчика."""
+        recipe_id = self.publish_recipe()
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user=self.user, receipt_id=recipe_id
+            ).exists()
+        )
+        self.assertEqual(self.get_feed_ids(), [recipe_id])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_heavy_author_is_read_on_demand(self):
+        """Рецепты тяжелого автора подмешиваются при чтении ленты."""
+        recipe_id = self.publish_recipe()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.get_feed_ids(), [recipe_id])
+
+    def test_feed_cursor_keeps_feed_order(self):
+        """Курсор ленты идет по записям ленты."""
+        recipe_ids = [self.publish_recipe() for _ in range(3)]
+        seen = []
+        url, params = self.feed_endpoint, {"cursor": "", "limit": 2}
+        with CaptureQueriesContext(connection) as context:
+            while url:
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                seen.extend(
+                    recipe["id"] for recipe in response.json()["results"]
+                )
+                url, params = response.json()["next"], None
+        self.assertEqual(seen, recipe_ids[::-1])
+        self.assertTrue(
+            any(
+                "receipts_feedentry" in query["sql"]
+                and "ORDER BY" in query["sql"]
+                for query in context.captured_queries
+            )
+        )
+
+    def test_unsubscribe_clears_feed(self):
+        """После отписки рецепты автора пропадают из ленты."""
+        self.publish_recipe()
+        self.client.delete(f"/api/users/{self.author.pk}/subscribe/")
+        self.assertEqual(self.get_feed_ids(), [])
+
+
+class SubscribedResolverTests(BaseTestData):
+    users_endpoint = "/api/users/"
+
+    def create_users(self, count):
+        user = get_user_model()
+        for number in range(count):
+            author = user.objects.create_user(
+                username=f"user_{user.objects.count()}",
+                email=f"user_{user.objects.count()}@example.com",
+            )
+            if number % 2:
+                Follow.objects.create(user=self.user, following=author)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.users_endpoint, {"limit": 100})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(context.captured_queries)
+
+    def test_users_list_queries_do_not_depend_on_users_count(self):
+        """is_subscribed для списка пользователей не дает N+1."""
+        self.create_users(2)
+        few_users_queries = self.count_queries()
+        self.create_users(6)
+        self.assertEqual(self.count_queries(), few_users_queries)
+
+    def test_is_subscribed_matches_follows(self):
+        """Флаг is_subscribed совпадает с подписками пользователя."""
+        self.create_users(4)
+        response = self.client.get(self.users_endpoint, {"limit": 100})
+        followed_ids = set(
+            self.user.followers.values_list("following_id", flat=True)
+        )
+        for user in response.json()["results"]:
+            self.assertEqual(
+                user["is_subscribed"], user["id"] in followed_ids
+            )
+
+
+class IngredientIndexTests(BaseTestData):
+    ingredients_endpoint = "/api/ingredients/"
+
+    def setUp(self):
+        super().setUp()
+        for name in ("Масло сливочное", "сливки", "Сливы", "слива"):
+            Ingredient.objects.create(name=name, measurement_unit="г")
+
+    def search(self, **params):
+        response = self.client.get(self.ingredients_endpoint, params)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [ingredient["name"] for ingredient in response.json()]
+
+    def test_search_ranking(self):
+        """Точные совпадения, затем префикс, затем вхождение."""
+        self.assertEqual(
+            self.search(name="слив"),
+            ["слива", "сливки", "Сливы", "Масло сливочное"],
+        )
+        self.assertEqual(
+            self.search(name="Масло"), ["масло", "Масло сливочное"]
+        )
+
+    def test_search_limit(self):
+        """Параметр limit ограничивает количество результатов."""
+        self.assertEqual(
+            self.search(name="слив", limit=2), ["слива", "сливки"]
+        )
+
+    def test_invalid_limit(self):
+        for limit in ("abc", "-1", "1.5", "²"):
+            with self.subTest(limit=limit):
+                response = self.client.get(
+                    self.ingredients_endpoint, {"name": "слив", "limit": limit}
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST
+                )
+                self.assertIn("limit", response.json())
+
+    def test_other_filters_are_applied(self):
+        """Вместе с search поиск идет через фильтры, а не индекс."""
+        self.assertEqual(self.search(name="слив", search="zzz"), [])
+        self.assertEqual(
+            self.search(name="слив", search="сливки", limit=1), ["сливки"]
+        )
+
+    def test_index_is_rebuilt_on_change(self):
+        """Новый ингредиент сразу находится поиском."""
+        self.search(name="слив")
+        Ingredient.objects.create(name="Сливочный сыр", measurement_unit="г")
+        self.assertIn("Сливочный сыр", self.search(name="сливоч"))
+
+    def test_search_does_not_query_database(self):
+        """Повторный поиск отвечает без запросов к базе."""
+        self.search(name="слив")
+        with self.assertNumQueries(0):
+            self.search(name="сли")
+
+
+class FuzzySearchTests(BaseTestData):
+    recipe_endpoint = "/api/recipes/"
+    ingredients_endpoint = "/api/ingredients/"
+
+    def setUp(self):
+        super().setUp()
+        for name in ("Томаты", "Картофель", "Творог"):
+            Ingredient.objects.create(name=name, measurement_unit="г")
+        for name in ("Салат с томатами", "Суп из картофеля", "Сырники"):
+            Receipt.objects.create(
+                author=self.user,
+                name=name,
+                text="Тестовое описание",
+                cooking_time=1,
+            )
+
+    def search(self, endpoint, query):
+        response = self.client.get(endpoint, {"search": query})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        data = response.json()
+        if isinstance(data, dict):
+            data = data["results"]
+        return [item["name"] for item in data]
+
+    def test_trigrams_match_pg_trgm(self):
+        """Триграммы строятся как в show_trgm из pg_trgm."""
+        self.assertEqual(
+            trigrams("Word!"), {"  w", " wo", "wor", "ord", "rd "}
+        )
+
+    def test_index_similarity(self):
+        """Сходство равно доле общих триграмм в объединении."""
+        index = TrigramIndex(((1, "томаты"), (2, "творог")))
+        self.assertEqual(index.search("томат", 0.3), [(1, 5 / 8)])
+
+    def test_search_with_typo(self):
+        """Рецепт находится по названию с опечаткой."""
+        self.assertEqual(
+            self.search(self.recipe_endpoint, "салт с томатами"),
+            ["Салат с томатами"],
+        )
+        self.assertEqual(
+            self.search(self.ingredients_endpoint, "картофль"),
+            ["Картофель"],
+        )
+
+    def test_search_with_synonym(self):
+        """Синонимы из SEARCH_SYNONYMS ищутся вместе с запросом."""
+        self.assertEqual(
+            self.search(self.ingredients_endpoint, "помидоры"), ["Томаты"]
+        )
+
+    def test_index_is_rebuilt_on_change(self):
+        """Новый рецепт сразу находится поиском."""
+        self.search(self.recipe_endpoint, "сырники")
+        Receipt.objects.create(
+            author=self.user,
+            name="Сырники с изюмом",
+            text="Тестовое описание",
+            cooking_time=1,
+        )
+        self.assertEqual(
+            self.search(self.recipe_endpoint, "сырники"),
+            ["Сырники", "Сырники с изюмом"],
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "Нужен pg_trgm.")
+    def test_pg_trgm_search(self):
+        """В PostgreSQL поиск идет в базе оператором % из pg_trgm."""
+        with CaptureQueriesContext(connection) as context:
+            names = self.search(self.recipe_endpoint, "салт с томатами")
+        self.assertEqual(names, ["Салат с томатами"])
+        self.assertTrue(
+            any(" % " in query["sql"] for query in context.captured_queries)
+        )
+
+    def test_search_with_cursor(self):
+        """Курсор проходит результаты поиска в порядке сходства."""
+        for name in ("Сырники с изюмом", "Сырники с ягодами"):
+            Receipt.objects.create(
+                author=self.user,
+                name=name,
+                text="Тестовое описание",
+                cooking_time=1,
+            )
+        expected = self.search(self.recipe_endpoint, "сырники")
+        self.assertEqual(len(expected), 3)
+        names = []
+        url = self.recipe_endpoint
+        params = {"cursor": "", "search": "сырники", "limit": 1}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            names += [item["name"] for item in response.json()["results"]]
+            url, params = response.json()["next"], None
+        self.assertEqual(names, expected)
+
+    def test_recipe_index_version_follows_names(self):
+        """Индекс названий рецептов сбрасывается только при изменении
+        названия, создании и удалении рецепта."""
+        recipe = Receipt.objects.create(
+            author=self.user, name="Сырники", text="Описание", cooking_time=1
+        )
+        version, _ = get_version(RECIPES)
+        recipe.text = "Новое описание"
+        recipe.save()
+        Receipt.objects.get(pk=recipe.pk).save()
+        Favorite.objects.create(user=self.user, receipt=recipe)
+        self.assertEqual(get_version(RECIPES)[0], version)
+        recipe.name = "Блины"
+        recipe.save(update_fields=("text",))
+        self.assertEqual(get_version(RECIPES)[0], version)
+        recipe.save()
+        self.assertEqual(get_version(RECIPES)[0], version + 1)
+        recipe.save()
+        self.assertEqual(get_version(RECIPES)[0], version + 1)
+        recipe.name = "Оладьи"
+        recipe.save(update_fields=("name",))
+        self.assertEqual(get_version(RECIPES)[0], version + 2)
+        recipe.delete()
+        self.assertEqual(get_version(RECIPES)[0], version + 3)
+
+
+class CatalogueSnapshotTests(BaseTestData):
+    tags_endpoint = "/api/tags/"
+    ingredients_endpoint = "/api/ingredients/"
+
+    def get_content(self, endpoint, accept_encoding=None, encoding=None):
+        headers = {}
+        if accept_encoding:
+            headers["HTTP_ACCEPT_ENCODING"] = accept_encoding
+        response = self.client.get(endpoint, **headers)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.get("Content-Encoding"), encoding)
+        return response.content
+
+    def test_snapshot_matches_serializer(self):
+        """Снимок совпадает с ответом сериализатора в любой кодировке."""
+        expected = JSONRenderer().render(
+            IngredientSerializer(Ingredient.objects.all(), many=True).data
+        )
+        self.assertEqual(self.get_content(self.ingredients_endpoint), expected)
+        self.assertEqual(
+            gzip.decompress(
+                self.get_content(self.ingredients_endpoint, "gzip", "gzip")
+            ),
+            expected,
+        )
+        self.assertEqual(
+            brotli.decompress(
+                self.get_content(self.ingredients_endpoint, "gzip, br", "br")
+            ),
+            expected,
+        )
+
+    def test_encoding_weights(self):
+        """Кодировка выбирается по q, q=0 ее запрещает."""
+        for accept_encoding, encoding in (
+            ("br;q=0, gzip", "gzip"),
+            ("gzip;q=0.5, br;q=0.8", "br"),
+            ("br;q=0, gzip;q=0", None),
+            ("identity, gzip;q=0.5", None),
+            ("*", "br"),
+            ("*;q=0.1, br;q=0", "gzip"),
+        ):
+            with self.subTest(accept_encoding=accept_encoding):
+                self.get_content(
+                    self.tags_endpoint, accept_encoding, encoding
+                )
+
+    def test_etag_depends_on_encoding(self):
+        """Варианты в разных кодировках имеют разные ETag."""
+        etags = {}
+        for accept_encoding in ("br", "gzip", "identity"):
+            response = self.client.get(
+                self.tags_endpoint, HTTP_ACCEPT_ENCODING=accept_encoding
+            )
+            self.assertIn("Accept-Encoding", response["Vary"])
+            etags[accept_encoding] = response["ETag"]
+            response = self.client.get(
+                self.tags_endpoint,
+                HTTP_ACCEPT_ENCODING=accept_encoding,
+                HTTP_IF_NONE_MATCH=response["ETag"],
+            )
+            self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+            self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(len(set(etags.values())), 3)
+        response = self.client.get(
+            self.tags_endpoint,
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=etags["br"],
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_snapshot_is_not_rendered_again(self):
+        """Повторный запрос не обращается к справочнику в базе."""
+        self.get_content(self.tags_endpoint)
+        with self.assertNumQueries(0):
+            self.get_content(self.tags_endpoint)
+
+    def test_snapshot_follows_catalogue_version(self):
+        """После изменения справочника отдается новый снимок."""
+        self.get_content(self.tags_endpoint)
+        Tag.objects.create(slug="dinner", name="ужин")
+        self.assertIn(
+            "ужин", self.get_content(self.tags_endpoint).decode()
+        )
+
+    def test_export_command(self):
+        """Команда пишет версионные и последние снимки."""
+        call_command("export_catalogue_snapshots")
+        names = {path.name for path in Path(self.snapshot_root).iterdir()}
+        for name in (TAGS, INGREDIENTS):
+            version, _ = get_version(name)
+            for suffix in ("", ".gz", ".br"):
+                self.assertIn(f"{name}.json{suffix}", names)
+                self.assertIn(f"{name}.v{version}.json{suffix}", names)
+
+
+class ShoppingCartTestData(BaseTestData):
+    download_endpoint = "/api/recipes/download_shopping_cart/"
+
+    def setUp(self):
+        super().setUp()
+        recipe = Receipt.objects.create(
+            author=self.user, name="Рецепт", text="Описание", cooking_time=1
+        )
+        IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=self.firstIndredient, amount=5
+        )
+        ShoppingList.objects.create(user=self.user, receipt=recipe)
+
+
+class PdfRenderTests(ShoppingCartTestData):
+    stylesheet = "body { margin: 0; }"
+
+    @override_settings(PDF_RENDER_WORKERS=0)
+    def test_inline_render(self):
+        """Без процессов пула PDF рендерится в самом воркере."""
+        response = self.client.get(self.download_endpoint)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(response.content.startswith(b"%PDF"))
+
+    @override_settings(PDF_RENDER_WORKERS=1, PDF_RENDER_MAX_TASKS=1)
+    def test_pool_is_recycled(self):
+        """Пул заменяется новым после лимита заданий на процесс."""
+        pool = PdfRenderPool(self.stylesheet)
+        self.assertTrue(pool.render("<p>1</p>").startswith(b"%PDF"))
+        first_executor = pool.executor
+        self.addCleanup(first_executor.shutdown)
+        self.assertTrue(pool.render("<p>2</p>").startswith(b"%PDF"))
+        self.addCleanup(pool.executor.shutdown)
+        self.assertIsNot(pool.executor, first_executor)
+
+    @override_settings(
+        PDF_RENDER_WORKERS=1,
+        PDF_RENDER_QUEUE_SIZE=1,
+        PDF_RENDER_TIMEOUT=0.01,
+    )
+    def test_busy_pool(self):
+        """Запрос не ждет места в пуле дольше таймаута."""
+        pool = PdfRenderPool(self.stylesheet)
+        pool.get_slots().acquire()
+        with self.assertRaises(PdfRenderUnavailable):
+            pool.render("<p>1</p>")
+
+
+@override_settings(PDF_RENDER_WORKERS=0)
+class ShoppingListCacheTests(ShoppingCartTestData):
+    def test_identical_carts_share_file(self):
+        """Повторное и чужое скачивание того же списка не рендерится."""
+        other_user = get_user_model().objects.create_user(
+            username="other", email="other@example.com"
+        )
+        ShoppingList.objects.create(
+            user=other_user, receipt=Receipt.objects.get()
+        )
+        other_client = APIClient()
+        other_client.force_authenticate(user=other_user)
+        with mock.patch(
+            "api.shopping_list.generate_file",
+            wraps=shopping_list.generate_file,
+        ) as generate_file:
+            responses = [
+                client.get(self.download_endpoint)
+                for client in (self.client, self.client, other_client)
+            ]
+        self.assertEqual(generate_file.call_count, 1)
+        self.assertEqual(len({response.content for response in responses}), 1)
+
+    @override_settings(SHOPPING_LIST_CACHE_MAX_BYTES=2)
+    def test_least_recently_used_file_is_evicted(self):
+        """При превышении размера удаляется давно не читанный файл."""
+        file_cache = FileCache(
+            "SHOPPING_LIST_CACHE_ROOT", "SHOPPING_LIST_CACHE_MAX_BYTES"
+        )
+        file_cache.set("first", b"1")
+        file_cache.set("second", b"2")
+        for name, written_at in (("first", 100), ("second", 200)):
+            os.utime(file_cache.root / name, (written_at, written_at))
+        self.assertEqual(file_cache.get("first"), b"1")
+        file_cache.set("third", b"3")
+        self.assertIsNone(file_cache.get("second"))
+        self.assertEqual(file_cache.get("first"), b"1")
+        self.assertEqual(file_cache.get("third"), b"3")
+
+
+@override_settings(PDF_RENDER_WORKERS=0)
+class ShoppingListFormatTests(ShoppingCartTestData):
+    def download(self, **kwargs):
+        response = self.client.get(self.download_endpoint, **kwargs)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response
+
+    def test_text_formats_are_streamed(self):
+        """Текстовые форматы отдаются потоком из базы."""
+        expected = {
+            "csv": "хлеб,г,5",
+            "txt": "1. хлеб (г) - 5",
+            "html": "<td>хлеб</td>",
+        }
+        for file_format, line in expected.items():
+            with self.subTest(file_format=file_format):
+                response = self.download(data={"format": file_format})
+                self.assertTrue(response.streaming)
+                self.assertEqual(
+                    response["Content-Disposition"],
+                    f'attachment; filename="shopping_list.{file_format}"',
+                )
+                content = b"".join(response.streaming_content).decode()
+                self.assertIn(line, content)
+
+    def test_json_format(self):
+        response = self.download(data={"format": "json"})
+        self.assertEqual(
+            json.loads(b"".join(response.streaming_content)),
+            [{"name": "хлеб", "measurement_unit": "г", "amount": 5}],
+        )
+
+    def test_accept_header(self):
+        """Без параметра формат выбирается по заголовку Accept."""
+        response = self.download(
+            HTTP_ACCEPT="application/pdf;q=0.5, text/csv"
+        )
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        response = self.download(HTTP_ACCEPT="application/pdf")
+        self.assertTrue(response.content.startswith(b"%PDF"))
+
+    def test_unknown_format(self):
+        response = self.client.get(
+            self.download_endpoint, data={"format": "docx"}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn("format", response.json())
+        response = self.client.get(
+            self.download_endpoint, HTTP_ACCEPT="image/png"
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_ACCEPTABLE)
+
+
+@override_settings(PDF_RENDER_WORKERS=0)
+class ShoppingListExportTests(ShoppingCartTestData):
+    def request_export(self):
+        response = self.client.post(self.download_endpoint)
+        self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)
+        self.assertEqual(response["Location"], response.json()["url"])
+        return response.json()["url"]
+
+    def test_large_cart_is_exported_by_worker(self):
+        """Большой список выгружается воркером и скачивается по заданию."""
+        url = self.request_export()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)
+        self.assertEqual(response.json()["status"], ShoppingListExport.PENDING)
+        call_command("process_shopping_list_exports", "--once")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(
+            b"".join(response.streaming_content).startswith(b"%PDF")
+        )
+
+    @override_settings(SHOPPING_LIST_EXPORT_X_ACCEL=True)
+    def test_file_is_sent_by_nginx(self):
+        """С X-Accel-Redirect файл отдает nginx из тома с медиа."""
+        url = self.request_export()
+        call_command("process_shopping_list_exports", "--once")
+        export = ShoppingListExport.objects.get()
+        response = self.client.get(url)
+        self.assertEqual(
+            response["X-Accel-Redirect"], f"/media/exports/{export.pk}.pdf"
+        )
+        self.assertEqual(response.content, b"")
+
+    def test_get_is_synchronous(self):
+        """GET отдает файл сразу и не создает заданий."""
+        response = self.client.get(self.download_endpoint, {"format": "pdf"})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.content.startswith(b"%PDF"))
+        self.assertFalse(ShoppingListExport.objects.exists())
+
+    def test_pending_export_is_reused(self):
+        """Повторный запрос не ставит в очередь второе задание."""
+        self.assertEqual(self.request_export(), self.request_export())
+
+    def test_export_is_claimed_once(self):
+        """Задание забирает только один воркер."""
+        self.request_export()
+        self.assertIsNotNone(claim_export())
+        self.assertIsNone(claim_export())
+
+    def test_foreign_export_is_not_found(self):
+        """Чужое задание недоступно."""
+        url = self.request_export()
+        other_user = get_user_model().objects.create_user(
+            username="other", email="other@example.com"
+        )
+        self.client.force_authenticate(user=other_user)
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.NOT_FOUND
+        )
+
+
+class CartTotalsTests(BaseTestData):
+    summary_endpoint = "/api/recipes/shopping_cart/summary/"
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = []
+        for number, amounts in enumerate(((2, 3), (5, 0))):
+            recipe = Receipt.objects.create(
+                author=self.user,
+                name=f"Рецепт {number}",
+                text="Описание",
+                cooking_time=1,
+            )
+            recipe.tags.set((self.tag,))
+            for ingredient, amount in zip(
+                (self.firstIndredient, self.secondIndredient), amounts
+            ):
+                if amount:
+                    IngredientInRecipe.objects.create(
+                        recipe=recipe, ingredient=ingredient, amount=amount
+                    )
+            self.recipes.append(recipe)
+
+    def cart_endpoint(self, recipe):
+        return f"/api/recipes/{recipe.pk}/shopping_cart/"
+
+    def get_summary(self):
+        response = self.client.get(self.summary_endpoint)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return {item["name"]: item["amount"] for item in response.json()}
+
+    def test_totals_follow_cart(self):
+        """Суммы меняются при добавлении и удалении рецептов."""
+        for recipe in self.recipes:
+            self.client.post(self.cart_endpoint(recipe))
+        self.assertEqual(self.get_summary(), {"хлеб": 7, "масло": 3})
+        self.client.delete(self.cart_endpoint(self.recipes[0]))
+        self.assertEqual(self.get_summary(), {"хлеб": 5})
+        self.client.delete(self.cart_endpoint(self.recipes[1]))
+        self.assertEqual(self.get_summary(), {})
+
+    def test_recipe_edit_updates_carts(self):
+        """Изменение ингредиентов рецепта попадает во все списки."""
+        self.client.post(self.cart_endpoint(self.recipes[0]))
+        response = self.client.patch(
+            f"/api/recipes/{self.recipes[0].pk}/",
+            {
+                "tags": [self.tag.pk],
+                "ingredients": [
+                    {"id": self.secondIndredient.pk, "amount": 10}
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(self.get_summary(), {"масло": 10})
+
+    def test_recipe_delete_updates_carts(self):
+        """Удаление рецепта убирает его ингредиенты из списков."""
+        for recipe in self.recipes:
+            self.client.post(self.cart_endpoint(recipe))
+        self.recipes[1].delete()
+        self.assertEqual(self.get_summary(), {"хлеб": 2, "масло": 3})
+
+    def test_summary_query_count(self):
+        """Сводка читается одним запросом без агрегации."""
+        for recipe in self.recipes:
+            self.client.post(self.cart_endpoint(recipe))
+        with CaptureQueriesContext(connection) as context:
+            self.get_summary()
+        summary_queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if "cartingredienttotal" in query["sql"]
+        ]
+        self.assertEqual(len(summary_queries), 1)
+        self.assertNotIn("SUM(", summary_queries[0])
+
+    def test_rebuild_command(self):
+        """Команда пересобирает рассогласованную таблицу."""
+        for recipe in self.recipes:
+            self.client.post(self.cart_endpoint(recipe))
+        expected = self.get_summary()
+        CartIngredientTotal.objects.update(total=1)
+        call_command("rebuild_cart_totals", "--check")
+        self.assertNotEqual(self.get_summary(), expected)
+        call_command("rebuild_cart_totals")
+        self.assertEqual(self.get_summary(), expected)
+
+    def test_bulk_cart(self):
+        """Массовое добавление и удаление с результатом по каждому id."""
+        bulk_endpoint = "/api/recipes/shopping_cart/bulk/"
+        first, second = (recipe.pk for recipe in self.recipes)
+        missing = second + 100
+        self.client.post(self.cart_endpoint(self.recipes[0]))
+        response = self.client.post(
+            bulk_endpoint, {"ids": [first, second, missing]}, format="json"
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            response.json()["results"],
+            [
+                {"id": first, "status": "already_added"},
+                {"id": second, "status": "added"},
+                {"id": missing, "status": "not_found"},
+            ],
+        )
+        self.assertEqual(self.get_summary(), {"хлеб": 7, "масло": 3})
+        response = self.client.delete(
+            bulk_endpoint, {"ids": [second, second]}, format="json"
+        )
+        self.assertEqual(
+            response.json()["results"], [{"id": second, "status": "removed"}]
+        )
+        self.assertEqual(self.get_summary(), {"хлеб": 2, "масло": 3})
+        response = self.client.delete(
+            bulk_endpoint, {"ids": [second]}, format="json"
+        )
+        self.assertEqual(
+            response.json()["results"],
+            [{"id": second, "status": "not_in_list"}],
+        )
+
+    def test_single_statement_mutations(self):
+        """Добавление и удаление - один запрос к таблице связи."""
+        endpoint = f"/api/recipes/{self.recipes[0].pk}/favorite/"
+        for method, expected_status in (
+            ("post", HTTPStatus.CREATED),
+            ("post", HTTPStatus.BAD_REQUEST),
+            ("delete", HTTPStatus.NO_CONTENT),
+            ("delete", HTTPStatus.BAD_REQUEST),
+        ):
+            with CaptureQueriesContext(connection) as context:
+                response = getattr(self.client, method)(endpoint)
+            self.assertEqual(response.status_code, expected_status)
+            favorite_queries = [
+                query
+                for query in context.captured_queries
+                if "receipts_favorite" in query["sql"]
+            ]
+            self.assertEqual(len(favorite_queries), 1)
+
+    def test_bulk_favorite_query_count(self):
+        """Число запросов не зависит от числа рецептов."""
+        ids = [recipe.pk for recipe in self.recipes]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                "/api/recipes/favorite/bulk/", {"ids": ids}, format="json"
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            set(self.user.favorites.values_list("receipt_id", flat=True)),
+            set(ids),
+        )
+        insert_queries = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith("INSERT")
+        ]
+        self.assertEqual(len(insert_queries), 1)
+        response = self.client.post(
+            "/api/recipes/favorite/bulk/", {"ids": []}, format="json"
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_bulk_add_race(self):
+        """Строка, добавленная параллельным запросом между чтением
+        и вставкой, не учитывается в счетчиках второй раз."""
+        first, second = (recipe.pk for recipe in self.recipes)
+
+        def get_links_then_race(model, user, recipe_ids):
+            links = get_links(model, user, recipe_ids)
+            Favorite.objects.create(user=user, receipt_id=first)
+            return links
+
+        with mock.patch("api.bulk.get_links", get_links_then_race):
+            response = self.client.post(
+                "/api/recipes/favorite/bulk/",
+                {"ids": [first, second]},
+                format="json",
+            )
+        self.assertEqual(
+            response.json()["results"],
+            [
+                {"id": first, "status": "already_added"},
+                {"id": second, "status": "added"},
+            ],
+        )
+        self.assertEqual(
+            self.get_counters(), {first: (1, 0), second: (1, 0)}
+        )
+
+    def get_counters(self):
+        return {
+            recipe.pk: (recipe.favorites_count, recipe.in_carts_count)
+            for recipe in Receipt.objects.all()
+        }
+
+    def test_recipe_counters(self):
+        """Счетчики рецептов следуют за избранным и корзинами."""
+        first, second = (recipe.pk for recipe in self.recipes)
+        other_user = get_user_model().objects.create_user(
+            username="other", email="other@example.com"
+        )
+        self.client.post(f"/api/recipes/{first}/favorite/")
+        self.client.post(self.cart_endpoint(self.recipes[0]))
+        self.client.post(
+            "/api/recipes/favorite/bulk/",
+            {"ids": [first, second]},
+            format="json",
+        )
+        Favorite.objects.create(user=other_user, receipt=self.recipes[0])
+        ShoppingList.objects.create(user=other_user, receipt=self.recipes[1])
+        self.assertEqual(
+            self.get_counters(), {first: (2, 1), second: (1, 1)}
+        )
+        self.client.delete(
+            "/api/recipes/shopping_cart/bulk/", {"ids": [first]}, format="json"
+        )
+        self.client.delete(f"/api/recipes/{second}/favorite/")
+        self.assertEqual(
+            self.get_counters(), {first: (2, 0), second: (0, 1)}
+        )
+        other_user.delete()
+        self.assertEqual(
+            self.get_counters(), {first: (1, 0), second: (0, 0)}
+        )
+
+    def test_recipe_edit_keeps_counters(self):
+        """Сохранение рецепта не перезаписывает счетчики."""
+        recipe = Receipt.objects.get(pk=self.recipes[0].pk)
+        self.client.post(f"/api/recipes/{recipe.pk}/favorite/")
+        recipe.name = "Новое название"
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_popular_ordering(self):
+        first, second = (recipe.pk for recipe in self.recipes)
+        self.client.post(f"/api/recipes/{first}/favorite/")
+        for ordering, expected in (
+            ("-favorites_count", [first, second]),
+            ("favorites_count", [second, first]),
+        ):
+            response = self.client.get(
+                "/api/recipes/", {"ordering": ordering}
+            )
+            self.assertEqual(
+                [recipe["id"] for recipe in response.json()["results"]],
+                expected,
+            )
+
+    def test_reconcile_counters_command(self):
+        """Команда исправляет разошедшиеся счетчики."""
+        self.client.post(self.cart_endpoint(self.recipes[0]))
+        Receipt.objects.update(favorites_count=5, in_carts_count=0)
+        call_command("reconcile_recipe_counters", "--check")
+        self.assertEqual(self.get_counters()[self.recipes[0].pk], (5, 0))
+        call_command("reconcile_recipe_counters")
+        self.assertEqual(
+            self.get_counters(),
+            {self.recipes[0].pk: (0, 1), self.recipes[1].pk: (0, 0)},
+        )
+
+
+class ConcurrentLinksTests(TransactionTestCase):
+    """Параллельные запросы.
+
+    SQLite в памяти не делится между потоками, поэтому тестовая база
+    SQLite задана файлом (DATABASES["default"]["TEST"]["NAME"]).
+    """
+
+    threads = 4
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("Тестовая база SQLite в памяти.")
+        self.user = get_user_model().objects.create_user(username="auth_user")
+        self.author = get_user_model().objects.create_user(
+            username="author", email="author@example.com"
+        )
+        self.recipe = Receipt.objects.create(
+            author=self.author, name="Рецепт", text="Описание", cooking_time=1
+        )
+        IngredientInRecipe.objects.create(
+            recipe=self.recipe,
+            ingredient=Ingredient.objects.create(
+                name="хлеб", measurement_unit="г"
+            ),
+            amount=5,
+        )
+
+    def run_concurrently(self, method, endpoint):
+        """Отправляет одинаковые запросы из нескольких потоков сразу."""
+        barrier = threading.Barrier(self.threads)
+        statuses = []
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            try:
+                barrier.wait()
+                statuses.append(getattr(client, method)(endpoint).status_code)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=send) for _ in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return sorted(statuses)
+
+    def test_double_click(self):
+        """Из одинаковых параллельных запросов срабатывает один."""
+        cart_endpoint = f"/api/recipes/{self.recipe.pk}/shopping_cart/"
+        subscribe_endpoint = f"/api/users/{self.author.pk}/subscribe/"
+        rejected = [HTTPStatus.BAD_REQUEST] * (self.threads - 1)
+        for endpoint in (
+            cart_endpoint,
+            f"/api/recipes/{self.recipe.pk}/favorite/",
+            subscribe_endpoint,
+        ):
+            with self.subTest(endpoint=endpoint):
+                self.assertEqual(
+                    self.run_concurrently("post", endpoint),
+                    [HTTPStatus.CREATED, *rejected],
+                )
+                totals = self.user.cart_totals.values_list("total", flat=True)
+                self.assertEqual(list(totals), [5])
+        self.assertEqual(self.user.followers.count(), 1)
+        self.assertEqual(
+            self.run_concurrently("delete", cart_endpoint),
+            [HTTPStatus.NO_CONTENT, *rejected],
+        )
+        self.assertFalse(self.user.cart_totals.exists())
+
+
+class ShortLinkTests(BaseTestData):
+    def setUp(self):
+        super().setUp()
+        short_link.clear_resolved()
+        self.addCleanup(short_link.clear_resolved)
+        hit_buffer.clear()
+        self.addCleanup(hit_buffer.clear)
+        self.recipe = Receipt.objects.create(
+            author=self.user, name="Рецепт", text="Описание", cooking_time=1
+        )
+
+    def test_recipe_link_without_writes(self):
+        """Ссылка на рецепт выдается и открывается без записи в базу."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                f"/api/recipes/{self.recipe.pk}/get-link/"
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(
+            [
+                query
+                for query in context.captured_queries
+                if not query["sql"].startswith("SELECT")
+            ]
+        )
+        code = response.json()["short-link"].rsplit("/", 1)[-1]
+        self.assertEqual(len(code), short_link.RECIPE_CODE_LENGTH)
+        with self.assertNumQueries(0):
+            response = self.client.get(f"/s/{code}/")
+        self.assertRedirects(
+            response,
+            f"/recipes/{self.recipe.pk}",
+            status_code=HTTPStatus.MOVED_PERMANENTLY,
+            fetch_redirect_response=False,
+        )
+        self.assertIn("public", response["Cache-Control"])
+
+    def test_codes_are_reversible(self):
+        recipe_ids = (1, 2, 3, 59, 1000, short_link.MAX_RECIPE_ID)
+        codes = [short_link.encode_recipe_id(pk) for pk in recipe_ids]
+        self.assertEqual(len(set(codes)), len(recipe_ids))
+        self.assertEqual(
+            [short_link.decode_recipe_id(code) for code in codes],
+            list(recipe_ids),
+        )
+        with override_settings(SHORT_LINK_SALT="other"):
+            self.assertNotEqual(short_link.encode_recipe_id(1), codes[0])
+            self.assertIsNone(short_link.decode_recipe_id(codes[0]))
+
+    def test_stored_links_resolve(self):
+        """Сохраненные ранее случайные ссылки продолжают работать."""
+        ShortLink.objects.create(full_url="/recipes/1", short_link="AbCdEfG")
+        response = self.client.get("/s/AbCdEfG/")
+        self.assertRedirects(
+            response, "/recipes/1", fetch_redirect_response=False
+        )
+        code = short_link.encode_recipe_id(self.recipe.pk)
+        broken = next(
+            code[:-1] + char
+            for char in short_link.ALLOWED_CHARS
+            if short_link.decode_recipe_id(code[:-1] + char) is None
+        )
+        response = self.client.get(f"/s/{broken}/")
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_stored_link_lookups(self):
+        """Один запрос к базе на промах, повторы - из кэшей."""
+        link = ShortLink.objects.create(
+            full_url="/recipes/1", short_link="AbCdEfG"
+        )
+        with self.assertNumQueries(1):
+            response = self.client.get("/s/AbCdEfG/")
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(
+            response["Cache-Control"],
+            f"public, max-age={settings.SHORT_LINK_TEMPORARY_MAX_AGE}",
+        )
+        with self.assertNumQueries(0):
+            self.client.get("/s/AbCdEfG/")
+        short_link.clear_resolved()
+        with self.assertNumQueries(0):
+            self.client.get("/s/AbCdEfG/")
+        for expected_queries in (1, 0):
+            with self.assertNumQueries(expected_queries):
+                response = self.client.get("/s/unknown/")
+            self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        link.full_url = "/recipes/2"
+        link.save()
+        response = self.client.get("/s/AbCdEfG/")
+        self.assertEqual(response["Location"], "/recipes/2")
+
+    @override_settings(SHORT_LINK_LRU_SIZE=1)
+    def test_lru_is_bounded(self):
+        for code in ("unknown1", "unknown2"):
+            self.client.get(f"/s/{code}/")
+        self.assertEqual(list(short_link._resolved), ["unknown2"])
+
+    @override_settings(SHORT_LINK_HITS_FLUSH_SIZE=4)
+    def test_hits_are_flushed_in_batch(self):
+        """Переходы пишутся одним запросом после накопления."""
+        ShortLink.objects.create(
+            full_url=f"/recipes/{self.recipe.pk}", short_link="AbCdEfG"
+        )
+        ShortLink.objects.create(full_url="/recipes/0", short_link="HjKmNpQ")
+        code = short_link.encode_recipe_id(self.recipe.pk)
+        for link in ("AbCdEfG", code, "HjKmNpQ"):
+            self.client.get(f"/s/{link}/")
+        self.assertFalse(ShortLink.objects.filter(hits__gt=0).exists())
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(f"/s/{code}/")
+        updates = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith("UPDATE")
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            dict(ShortLink.objects.values_list("short_link", "hits")),
+            {"AbCdEfG": 3, "HjKmNpQ": 1},
+        )
+        self.assertIsNotNone(ShortLink.objects.get(hits=3).last_hit)
+
+    def test_hits_create_recipe_links(self):
+        """Для кода рецепта без строки строка создается при записи."""
+        code = short_link.encode_recipe_id(self.recipe.pk)
+        self.client.get(f"/s/{code}/")
+        self.assertEqual(hit_buffer.flush(), 1)
+        link = ShortLink.objects.get()
+        self.assertEqual((link.short_link, link.hits), (code, 1))
+
+    def test_hits_ignore_missing_recipes(self):
+        """Переходы по кодам несуществующих рецептов не создают строк."""
+        code = short_link.encode_recipe_id(self.recipe.pk + 1000)
+        response = self.client.get(f"/s/{code}/")
+        self.assertEqual(
+            response.status_code, HTTPStatus.MOVED_PERMANENTLY
+        )
+        hit_buffer.flush()
+        self.assertFalse(ShortLink.objects.exists())
+
+    def test_bench_leaves_no_traces(self):
+        """Замер не чистит чужие ключи кэша и не копит переходы."""
+        cache.set("unrelated", 1)
+        call_command("bench_short_links", "--links", "8", "--hits", "10")
+        self.assertEqual(cache.get("unrelated"), 1)
+        self.assertFalse(ShortLink.objects.exists())
+        self.assertEqual(hit_buffer.flush(), 0)
+
+    def test_short_link_map_is_incremental(self):
+        """Карта nginx дописывается только ссылками новых рецептов."""
+        path = Path(settings.SHORT_LINK_MAP_PATH)
+        call_command("export_short_links", "--batch-size", "1")
+        code = short_link.encode_recipe_id(self.recipe.pk)
+        self.assertIn(
+            f'{code} "{code} /recipes/{self.recipe.pk}";',
+            path.read_text().splitlines(),
+        )
+        recipe = Receipt.objects.create(
+            author=self.user, name="Новый", text="Описание", cooking_time=1
+        )
+        with CaptureQueriesContext(connection) as context:
+            call_command("export_short_links")
+        self.assertEqual(
+            len(
+                [
+                    query
+                    for query in context.captured_queries
+                    if query["sql"].startswith("INSERT")
+                ]
+            ),
+            1,
+        )
+        lines = path.read_text().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn(f"last recipe {recipe.pk}", lines[0])
+        self.assertEqual(
+            set(ShortLink.objects.values_list("full_url", flat=True)),
+            {f"/recipes/{self.recipe.pk}", f"/recipes/{recipe.pk}"},
+        )
+        response = self.client.get(
+            "/s/{}/".format(short_link.encode_recipe_id(recipe.pk))
+        )
+        self.assertEqual(response["Location"], f"/recipes/{recipe.pk}")
+        with override_settings(SHORT_LINK_SALT="other"):
+            call_command("export_short_links")
+            self.assertIn(
+                short_link.encode_recipe_id(self.recipe.pk), path.read_text()
+            )
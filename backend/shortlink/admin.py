@@ -1,10 +1,19 @@
 from django.contrib import admin
 
+from shortlink.hits import hit_buffer
 from shortlink.models import ShortLink
 
 
 class ShortLinkAdmin(admin.ModelAdmin):
-    list_display = ("full_url", "short_link")
+    list_display = ("full_url", "short_link", "hits", "last_hit")
+    readonly_fields = ("hits", "last_hit")
+    search_fields = ("full_url", "short_link")
+    ordering = ("-hits",)
+
+    def changelist_view(self, request, extra_context=None):
+        """Перед показом статистики записывает переходы этого воркера."""
+        hit_buffer.flush()
+        return super().changelist_view(request, extra_context)
 
 
 admin.site.register(ShortLink, ShortLinkAdmin)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ShortlinkConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "shortlink"
+
+    def ready(self):
+        from shortlink import signals  # noqa: F401
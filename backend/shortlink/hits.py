@@ -0,0 +1,155 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from receipts.models import Receipt
+from shortlink.models import ShortLink
+from shortlink.short_link import decode_recipe_id
+
+
+logger = logging.getLogger(__name__)
+
+
+def write_hits(hits):
+    """Переносит накопленные переходы в ShortLink.
+
+    hits - словарь {полная ссылка: (код, число переходов, время
+    последнего)}. Переходы считаются по полной ссылке, поэтому
+    старый случайный код и код рецепта одного рецепта попадают в одну
+    строку. Строки для кодов рецептов создаются, если их нет и рецепт
+    существует: иначе перебор кодов наполнял бы таблицу. Затем все
+    счетчики увеличиваются одним UPDATE с CASE, переходы без строки
+    не учитываются.
+    """
+    recipe_ids = {}
+    for url, (code, _, _) in hits.items():
+        recipe_id = decode_recipe_id(code)
+        if recipe_id is not None:
+            recipe_ids[url] = recipe_id
+    existing = set(
+        Receipt.objects.filter(pk__in=recipe_ids.values()).values_list(
+            "pk", flat=True
+        )
+    )
+    ShortLink.objects.bulk_create(
+        (
+            ShortLink(full_url=url, short_link=hits[url][0])
+            for url, recipe_id in recipe_ids.items()
+            if recipe_id in existing
+        ),
+        ignore_conflicts=True,
+    )
+    ShortLink.objects.filter(full_url__in=hits).update(
+        hits=F("hits")
+        + Case(
+            *(
+                When(full_url=url, then=Value(count))
+                for url, (_, count, _) in hits.items()
+            ),
+            default=Value(0),
+        ),
+        last_hit=Case(
+            *(
+                When(
+                    full_url=url,
+                    then=Greatest(
+                        Coalesce(F("last_hit"), Value(last_hit)),
+                        Value(last_hit),
+                    ),
+                )
+                for url, (_, _, last_hit) in hits.items()
+            ),
+            default=F("last_hit"),
+        ),
+    )
+
+
+class HitBuffer:
+    """Буфер переходов по коротким ссылкам в памяти процесса.
+
+    Переходы копятся и записываются одним запросом после
+    SHORT_LINK_HITS_FLUSH_SIZE переходов или через
+    SHORT_LINK_HITS_FLUSH_INTERVAL секунд после первого незаписанного
+    (по таймеру в фоновом потоке). При падении процесса теряется не
+    больше одного окна. Воркеры gunicorn пишут свои буферы независимо:
+    счетчики увеличиваются через F(), а не перезаписываются.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.hits = {}
+        self.pending = 0
+        self.timer = None
+
+    def add(self, link, url):
+        now = timezone.now()
+        with self.lock:
+            if self.pid != os.getpid():
+                # Буфер унаследован от родителя при fork.
+                self.reset()
+            _, count, _ = self.hits.get(url, (link, 0, now))
+            self.hits[url] = (link, count + 1, now)
+            self.pending += 1
+            flush_now = self.pending >= settings.SHORT_LINK_HITS_FLUSH_SIZE
+            if not flush_now and self.timer is None:
+                self.timer = threading.Timer(
+                    settings.SHORT_LINK_HITS_FLUSH_INTERVAL,
+                    self.flush_in_background,
+                )
+                self.timer.daemon = True
+                self.timer.start()
+        if flush_now:
+            self.flush()
+
+    def take(self):
+        with self.lock:
+            hits = self.hits
+            if self.timer is not None:
+                self.timer.cancel()
+            self.reset()
+        return hits
+
+    def flush(self):
+        """Записывает накопленные переходы. Возвращает их число."""
+        hits = self.take()
+        if not hits:
+            return 0
+        try:
+            with transaction.atomic():
+                write_hits(hits)
+        except Exception:
+            logger.exception("Не удалось записать переходы по ссылкам")
+            return 0
+        return sum(count for _, count, _ in hits.values())
+
+    def flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def clear(self):
+        """Сбрасывает буфер без записи."""
+        self.take()
+
+
+hit_buffer = HitBuffer()
+# При штатной остановке воркера накопленное записывается.
+atexit.register(hit_buffer.flush)
+
+
+def count_hit(link, url):
+    """Учитывает переход по короткой ссылке link на url."""
+    if settings.SHORT_LINK_HITS_FLUSH_SIZE:
+        hit_buffer.add(link, url)
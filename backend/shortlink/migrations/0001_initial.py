@@ -0,0 +1,50 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="ShortLink",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "full_url",
+                    models.TextField(
+                        help_text="Обязательное поле",
+                        unique=True,
+                        verbose_name="Полная ссылка",
+                    ),
+                ),
+                (
+                    "short_link",
+                    models.CharField(
+                        blank=True,
+                        db_index=True,
+                        help_text="Обязательное поле, несмотря на то что может быть пустым",
+                        max_length=32,
+                        unique=True,
+                        verbose_name="Короткая ссылка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Короткая ссылка",
+                "verbose_name_plural": "Короткие ссылки",
+            },
+        ),
+    ]
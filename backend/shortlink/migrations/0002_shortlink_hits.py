@@ -0,0 +1,32 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shortlink", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shortlink",
+            name="hits",
+            field=models.PositiveBigIntegerField(
+                default=0,
+                help_text="Заполняется автоматически",
+                verbose_name="Переходов",
+            ),
+        ),
+        migrations.AddField(
+            model_name="shortlink",
+            name="last_hit",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Заполняется автоматически",
+                null=True,
+                verbose_name="Последний переход",
+            ),
+        ),
+    ]
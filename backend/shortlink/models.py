@@ -18,6 +18,18 @@ class ShortLink(models.Model):
         ),
     )
 
+    hits = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="Переходов",
+        help_text="Заполняется автоматически",
+    )
+    last_hit = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Последний переход",
+        help_text="Заполняется автоматически",
+    )
+
     class Meta:
         verbose_name = "Короткая ссылка"
         verbose_name_plural = "Короткие ссылки"
@@ -1,14 +1,37 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from math import gcd
 from random import choice
+from time import monotonic
+from typing import Optional, Tuple
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import IntegrityError
 
 from shortlink.models import ShortLink
-from shortlink.exceptions import UnableToCreateLink, ShortLinkDoesNotExist
+from shortlink.exceptions import UnableToCreateLink
 
 
 LINK_LENGTH = 7
 LINK_CREATION_ATTEMPTS = 3
 ALLOWED_CHARS = "ABCDEFGHJKLMNOPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz234567890"
+CHAR_VALUES = {char: value for value, char in enumerate(ALLOWED_CHARS)}
+BASE = len(ALLOWED_CHARS)
+# Коды рецептов короче случайных ссылок (LINK_LENGTH и длиннее),
+# поэтому сохраненные в базе ссылки с ними не пересекаются.
+RECIPE_CODE_LENGTH = 6
+CODE_SPACE = BASE ** RECIPE_CODE_LENGTH
+# Код хранит id рецепта и контрольный символ.
+MAX_RECIPE_ID = CODE_SPACE // BASE - 1
+RECIPE_URL = "/recipes/{}"
+LINK_CACHE_KEY = "short_link:{}"
+
+# Локальный LRU сохраненных ссылок: код -> (ссылка или None, срок).
+_resolved = OrderedDict()
+_resolved_lock = threading.Lock()
 
 
 def get_random(tries=0) -> str:
@@ -34,10 +57,134 @@ def get_or_create_short_link(url: str) -> str:
     raise UnableToCreateLink("Не удалось создать уникальную ссылку.")
 
 
-def get_full_link(link: str) -> str:
-    """Возвращает полную ссылку из короткой."""
-    try:
-        url = ShortLink.objects.get(short_link__exact=link)
-    except ShortLink.DoesNotExist:
-        raise ShortLinkDoesNotExist("Такой короткой ссылки не существует.")
-    return url.full_url
+@lru_cache(maxsize=None)
+def get_permutation(salt: str) -> Tuple[int, int, int]:
+    """Параметры перестановки кодов a * x + b по модулю CODE_SPACE.
+
+    Возвращает множитель, обратный к нему множитель и сдвиг,
+    выведенные из соли.
+    """
+    digest = hashlib.sha256(f"shortlink:{salt}".encode()).digest()
+    multiplier = int.from_bytes(digest[:8], "big") % CODE_SPACE
+    while gcd(multiplier, CODE_SPACE) != 1:
+        multiplier += 1
+    offset = int.from_bytes(digest[8:16], "big") % CODE_SPACE
+    return multiplier, pow(multiplier, -1, CODE_SPACE), offset
+
+
+def get_check_value(recipe_id: int, salt: str) -> int:
+    digest = hashlib.sha256(f"{salt}:{recipe_id}".encode()).digest()
+    return int.from_bytes(digest[:4], "big") % BASE
+
+
+def encode_recipe_id(recipe_id: int) -> str:
+    """Короткий код рецепта, вычисляемый без обращения к базе.
+
+    id с контрольным символом переставляется аффинной перестановкой
+    с параметрами из SHORT_LINK_SALT, поэтому соседние рецепты
+    получают непохожие коды.
+    """
+    if not 0 < recipe_id <= MAX_RECIPE_ID:
+        raise UnableToCreateLink("Слишком большой id рецепта.")
+    salt = settings.SHORT_LINK_SALT
+    multiplier, _, offset = get_permutation(salt)
+    value = recipe_id * BASE + get_check_value(recipe_id, salt)
+    value = (value * multiplier + offset) % CODE_SPACE
+    chars = []
+    for _ in range(RECIPE_CODE_LENGTH):
+        value, char_value = divmod(value, BASE)
+        chars.append(ALLOWED_CHARS[char_value])
+    return "".join(reversed(chars))
+
+
+def decode_recipe_id(link: str) -> Optional[int]:
+    """id рецепта из кода encode_recipe_id или None для других строк."""
+    if len(link) != RECIPE_CODE_LENGTH:
+        return None
+    value = 0
+    for char in link:
+        if char not in CHAR_VALUES:
+            return None
+        value = value * BASE + CHAR_VALUES[char]
+    salt = settings.SHORT_LINK_SALT
+    _, inverse, offset = get_permutation(salt)
+    recipe_id, check_value = divmod(
+        (value - offset) * inverse % CODE_SPACE, BASE
+    )
+    if not recipe_id or check_value != get_check_value(recipe_id, salt):
+        return None
+    return recipe_id
+
+
+def get_recipe_short_link(recipe_id: int) -> str:
+    """Возвращает короткую ссылку рецепта без записи в базу."""
+    return encode_recipe_id(recipe_id)
+
+
+def link_cache_key(link: str) -> str:
+    # Код из адреса может содержать любые символы, ключ - его хэш.
+    return LINK_CACHE_KEY.format(hashlib.md5(link.encode()).hexdigest())
+
+
+def get_stored_link(link: str) -> Optional[str]:
+    """Полная ссылка из ShortLink через общий кэш.
+
+    Отсутствующие коды тоже кэшируются (пустой строкой), но на
+    SHORT_LINK_NEGATIVE_CACHE_TIMEOUT.
+    """
+    key = link_cache_key(link)
+    url = cache.get(key)
+    if url is None:
+        url = (
+            ShortLink.objects.filter(short_link=link)
+            .values_list("full_url", flat=True)
+            .first()
+        ) or ""
+        cache.set(
+            key,
+            url,
+            timeout=(
+                settings.SHORT_LINK_CACHE_TIMEOUT
+                if url
+                else settings.SHORT_LINK_NEGATIVE_CACHE_TIMEOUT
+            ),
+        )
+    return url or None
+
+
+def resolve_stored_link(link: str) -> Optional[str]:
+    """Полная ссылка из ShortLink или None.
+
+    Сначала проверяется ограниченный LRU процесса (записи живут
+    SHORT_LINK_LRU_TIMEOUT секунд), затем общий кэш, и только при
+    промахе обоих выполняется один запрос к базе.
+    """
+    now = monotonic()
+    with _resolved_lock:
+        entry = _resolved.get(link)
+        if entry is not None and entry[1] > now:
+            _resolved.move_to_end(link)
+            return entry[0]
+    url = get_stored_link(link)
+    with _resolved_lock:
+        _resolved[link] = (url, now + settings.SHORT_LINK_LRU_TIMEOUT)
+        _resolved.move_to_end(link)
+        while len(_resolved) > settings.SHORT_LINK_LRU_SIZE:
+            _resolved.popitem(last=False)
+    return url
+
+
+def forget_link(link: str) -> None:
+    """Удаляет ссылку из кэшей после ее изменения.
+
+    LRU других процессов устаревает сам за SHORT_LINK_LRU_TIMEOUT.
+    """
+    with _resolved_lock:
+        _resolved.pop(link, None)
+    cache.delete(link_cache_key(link))
+
+
+def clear_resolved() -> None:
+    """Очищает LRU текущего процесса."""
+    with _resolved_lock:
+        _resolved.clear()
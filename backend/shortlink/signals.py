@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from shortlink.models import ShortLink
+from shortlink.short_link import forget_link
+
+
+@receiver(post_save, sender=ShortLink)
+@receiver(post_delete, sender=ShortLink)
+def short_link_changed(sender, instance, **kwargs):
+    link = instance.short_link
+    forget_link(link)
+    transaction.on_commit(lambda: forget_link(link))
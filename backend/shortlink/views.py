@@ -1,12 +1,36 @@
-from django.shortcuts import redirect, render
+from django.conf import settings
+from django.http import HttpResponseNotFound
+from django.shortcuts import redirect
+from django.utils.cache import patch_cache_control
 
 from shortlink import short_link
-from shortlink.exceptions import ShortLinkDoesNotExist
+from shortlink.hits import count_hit
 
 
 def reverse_short(request, link):
-    try:
-        print(link, "\n", short_link.get_full_link(link))
-        return redirect(short_link.get_full_link(link))
-    except ShortLinkDoesNotExist:
-        return render(request, "404.html", status=404)
+    """Перенаправляет по короткой ссылке.
+
+    Ссылки на рецепты не меняются и отдаются постоянным редиректом,
+    сохраненные в базе - временным: их можно изменить в админке.
+    Ответы, в том числе 404, кэшируются клиентами и прокси.
+    Переходы учитываются в буфере и записываются пачками.
+    """
+    recipe_id = short_link.decode_recipe_id(link)
+    if recipe_id is not None:
+        url = short_link.RECIPE_URL.format(recipe_id)
+        response = redirect(url, permanent=True)
+        max_age = settings.SHORT_LINK_PERMANENT_MAX_AGE
+    else:
+        url = short_link.resolve_stored_link(link)
+        if url is None:
+            response = HttpResponseNotFound(
+                "Такой короткой ссылки не существует."
+            )
+            max_age = settings.SHORT_LINK_NEGATIVE_CACHE_TIMEOUT
+        else:
+            response = redirect(url)
+            max_age = settings.SHORT_LINK_TEMPORARY_MAX_AGE
+    if url is not None:
+        count_hit(link, url)
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response